@@ -1,12 +1,11 @@
 # Assorted objects needed for the game, defined in one little place to keep the logic code
-from pygame import Rect
-from math import sqrt
-from ui import Content
-from GameData.windows import SPECIAL_CHARS
-from collections import deque
-from random import randint
+from bisect import bisect_right
+from array import array
+from GameData.rng import GameRandom
 
 
+NEIGHBOUR_STEPS = [(0,-1), (1,0), (0,1), (-1,0), (1,-1), (1,1), (-1,1), (-1,-1)] # straight moves first, then diagonals
+
 MONTHS = {
     "JAN":31,
     "FEB":28,
@@ -24,6 +23,10 @@ MONTHS = {
 
 class Cabinet:
     # loads from a csv of cabinet data.
+    # __slots__ so the whole catalogue doesn't carry a __dict__ per cabinet
+    __slots__ = ("name", "price", "description", "release", "genre", "owned", "location", "players", "play_locations",
+                 "next_play_pos", "current_players", "busy", "playtime", "property", "day_data")
+
     def __init__(self, file_data):
 
         self.name = file_data[0]
@@ -41,12 +44,13 @@ class Cabinet:
         
         self.busy = False
         self.playtime = 5 # how many ticks does a single game last, on average
+        self.property = None # where we've been placed
 
-        self.historic_data = deque([],30) # Hold 30 days of historical data
-        self.day_data = {"Day":0,"Plays":0,"Income":0.00}
+        self.day_data = {"Day":0,"Plays":0,"Income":0.00} # today so far, GameData.history keeps the rest
         
     def set_position(self, new_position, property):
         self.location = new_position
+        self.property = property
         # Check what direction we can actually play from:
         self.play_locations = []
         placement_tries = self.players
@@ -86,14 +90,17 @@ class Cabinet:
         self.next_play_pos += 1
         if self.current_players >= self.players:
             self.busy = True
+            self.property.cabinet_index.refresh(self)
         self.day_data["Plays"] += 1
         self.day_data["Income"] += self.price
         customer.money -= self.price
+        customer.act_timer = self.playtime
         
 
     def end_play(self, customer):
         if self.busy:
             self.busy = False
+            self.property.cabinet_index.refresh(self)
         self.current_players -= 1
         if self.play_locations.index(customer.location) < self.next_play_pos:
             self.next_play_pos = self.play_locations.index(customer.location)
@@ -105,14 +112,64 @@ class PropertyDoor:
         self.location = [x,y]
 
 
+class CustomerProfile:
+    # Who a customer is: one per line of customerlist.csv, shared by every customer made from it (so don't change it!)
+    # weight is how likely it is to be picked compared to the others, see CustomerPool
+    __slots__ = ("name", "preference", "money", "patience", "colour", "weight")
+
+    def __init__(self, file_data):
+        self.name = file_data[0]
+        self.preference = file_data[1]
+        self.money = float(file_data[2])
+        self.patience = int(file_data[3])
+        self.colour = file_data[4]
+        self.weight = float(file_data[5])
+
+
+DEFAULT_PROFILE = CustomerProfile(["LARRY", "MAZE", "50.00", "100", "GREEN", "1"]) # for when nobody gave us a pool
+
+
+class CustomerPool:
+    # All the customer profiles, picked from at random by weight.
+    def __init__(self, rows:list = ()):
+        self.profiles = [profile for profile in map(CustomerProfile, rows) if profile.weight > 0]
+        if len(self.profiles) == 0:
+            self.profiles = [DEFAULT_PROFILE]
+        # cumulative[i] is the total weight of profiles 0..i, so one random number and a binary search picks one
+        self.cumulative = array("d")
+        total = 0.0
+        for profile in self.profiles:
+            total += profile.weight
+            self.cumulative.append(total)
+        self.by_name = {}
+        for profile in self.profiles:
+            self.by_name.setdefault((profile.name, profile.preference), profile)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def sample(self, rng:GameRandom) -> CustomerProfile:
+        pick = bisect_right(self.cumulative, rng.random() * self.cumulative[-1])
+        return self.profiles[min(pick, len(self.profiles) - 1)]
+
+    def find(self, name:str, preference:str) -> CustomerProfile:
+        # The profile called name, for loading saves. If the list changed since, makes a stand-in with what we know.
+        profile = self.by_name.get((name, preference))
+        if profile == None:
+            profile = CustomerProfile([name, preference, DEFAULT_PROFILE.money, DEFAULT_PROFILE.patience, DEFAULT_PROFILE.colour, 0])
+        return profile
+
+
 class Customer:
-    # TODO: load customer data from file
-    def __init__(self, active_property):
+    # The stuff that's the same every visit lives in profile (a CustomerProfile), this is just what changes while they're here.
+    __slots__ = ("profile", "money", "patience", "location", "playing", "play_timer", "state", "target",
+                 "target_loc", "act_timer", "order", "active_property", "rng", "destroy")
+
+    def __init__(self, active_property, rng:GameRandom|None = None, profile:CustomerProfile = DEFAULT_PROFILE):
         # Set per customer profile
-        self.name = "LARRY"
-        self.preference = "MAZE"
-        self.money = 50.00
-        self.patience = 100
+        self.profile = profile
+        self.money = profile.money # what they've got left to spend
+        self.patience = profile.patience
         # To be set by the game as they play stuff:
 
         self.location = [-1,-1]
@@ -122,23 +179,32 @@ class Customer:
         self.target = None
         self.target_loc = [0,0]
         self.act_timer = 0 # How long for our action to expire
+        self.order = 0 # when we came in, customers take their turns in this order
         self.active_property = active_property
-        # Visual representation:
-        self.icon = Content(self.location, SPECIAL_CHARS["smiley"], "GREEN", "BLACK")
+        self.rng = rng if rng != None else active_property.rng # share the game's random numbers, so seeded games repeat exactly
+        # (no icon here, the PropertyMap makes one for each customer it shows)
         # If they are ready to leave:
         self.destroy = False
+
+    @property
+    def name(self) -> str:
+        return self.profile.name
+
+    @property
+    def preference(self) -> str:
+        return self.profile.preference
         
     def enter_property(self, new_property):
         pass
 
     def set_location(self, new_location:list|tuple):
         self.location = list(new_location)
-        self.icon.area.update(self.location, (1,1))
     
-    def do_action(self) -> str:
+    def do_action(self, turns:int = 1) -> str:
         # Chooses and executes an action.
+        # turns is how many movement ticks went by since our last action, players get to sleep through their game (see next_turn)
         if self.state == "PLAY":
-            self.act_timer -= 1
+            self.act_timer -= turns
             if self.act_timer < 1 and self.target != None:
                 self.target.end_play(self)
                 self.state = "WANDER"
@@ -178,7 +244,7 @@ class Customer:
                 self.target.start_play(self)
                 return "PLAYSTART"
         elif self.state == "ENTER":
-            if randint(0,10) < 7:
+            if self.rng.randint(0,10) < 7:
                 self.get_new_target()
                 if self.move_to_target():
                     self.state = "PLAY"
@@ -190,19 +256,18 @@ class Customer:
                 self.wander()
         return self.state
 
-    def get_new_target(self):
-        new_target = None
+    def next_turn(self) -> int:
+        # How many movement ticks until we need to do_action again.
+        # Playing just counts down act_timer, so we can skip straight to the end of the game. Everything else acts every tick.
+        if self.state == "PLAY" and self.target != None:
+            return max(1, self.act_timer)
+        return 1
 
-        for cab in self.active_property.cabinets:
-            
-            if cab.busy:
-                continue # skip currently occupied cabinets
-            elif new_target == None: # always take the first available cabinet, as a backup
-                new_target = cab
-            elif cab.genre == self.preference and new_target.genre != self.preference: # always prefer a cabinet in our favourite genre, even if further away
-                new_target = cab
-            elif get_distance(self.location, new_target.location) > get_distance(self.location, cab.location): # otherwise bias towards the closest cabinet
-                new_target = cab
+    def get_new_target(self):
+        # always prefer the closest free cabinet in our favourite genre, even if others are closer
+        new_target = self.active_property.cabinet_index.nearest(self.location, self.preference)
+        if new_target == None: # otherwise take the closest free one
+            new_target = self.active_property.cabinet_index.nearest(self.location)
 
         if new_target == None:
             self.target = None
@@ -216,39 +281,131 @@ class Customer:
             
 
     def wander(self):
-        self.target_loc = [randint(0,self.active_property.size[0]), randint(0,self.active_property.size[1])]
+        self.target_loc = [self.rng.randint(0,self.active_property.size[0]), self.rng.randint(0,self.active_property.size[1])]
         self.move_to_target()
 
     def move_to_target(self)-> bool:
-        # moves the customer towards their target
+        # moves the customer one step towards their target. Cabinets and the door have shared paths (see FlowField),
+        # anywhere else (like a wander spot) just gets a step straight at it.
         if self.location != self.target_loc:
-            # find the direction to go:
-            move_x = 0
-            move_y = 0
-            if self.location[0] > self.target_loc[0]:
-                move_x = -1
-            elif self.location[0] < self.target_loc[0]:
-                move_x += 1
-            if self.location[1] > self.target_loc[1]:
-                move_y = -1
-            elif self.location[1] < self.target_loc[1]:
-                move_y = 1
-            try_location = [self.location[0] + move_x, self.location[1] + move_y]
-            if self.active_property.is_space_empty(try_location):
-                self.location = try_location
-            elif self.active_property.is_space_empty([self.location[0] + move_x, self.location[1]]) and move_x != 0:
-                self.location = try_location
-            elif self.active_property.is_space_empty([self.location[0], self.location[1] + move_y]) and move_y != 0:
-                self.location = try_location
-        self.icon.area.update(self.location, (1,1))
+            flow_field = self.active_property.get_flow_field(self.target_loc)
+            steps = flow_field.get_steps(self.location) if flow_field != None else self.straight_steps()
+            for step in steps:
+                if self.active_property.is_space_empty(step): # if someone's in the way, try the next best step
+                    self.active_property.move_customer(self, step)
+                    break
         if self.location == self.target_loc:
             return True
         else:
             return False
 
+    def straight_steps(self) -> list:
+        # The diagonal step towards target_loc, then the steps along each axis on their own, for when it's blocked.
+        move_x = (self.target_loc[0] > self.location[0]) - (self.target_loc[0] < self.location[0])
+        move_y = (self.target_loc[1] > self.location[1]) - (self.target_loc[1] < self.location[1])
+        steps = [[self.location[0] + move_x, self.location[1] + move_y]]
+        if move_x != 0 and move_y != 0:
+            steps.append([self.location[0] + move_x, self.location[1]])
+            steps.append([self.location[0], self.location[1] + move_y])
+        return steps
+
+class FlowField:
+    # Shortest paths from every space in a property to one goal space, going around cabinets.
+    # Customers don't count as walls here since they move around, check for them when you take a step.
+    # Build one per goal and share it, they only go stale when the cabinet layout changes.
+    def __init__(self, active_property, goal:list|tuple):
+        self.goal = (goal[0], goal[1])
+        self.width = active_property.size[0] + 1 # the property's size is the last valid coordinate, not the count
+        self.height = active_property.size[1] + 1
+        blocked = set((cab.location[0], cab.location[1]) for cab in active_property.cabinets)
+        # Breadth-first search out from the goal:
+        self.distance = {self.goal:0}
+        frontier = [self.goal]
+        while frontier:
+            next_frontier = []
+            for space in frontier:
+                for step_x, step_y in NEIGHBOUR_STEPS:
+                    neighbour = (space[0] + step_x, space[1] + step_y)
+                    if neighbour in self.distance or neighbour in blocked:
+                        continue
+                    if neighbour[0] < 0 or neighbour[0] >= self.width or neighbour[1] < 0 or neighbour[1] >= self.height:
+                        continue
+                    self.distance[neighbour] = self.distance[space] + 1
+                    next_frontier.append(neighbour)
+            frontier = next_frontier
+        # For every space, the neighbours that get us closer, best first:
+        self.steps = {}
+        for space, distance in self.distance.items():
+            downhill = []
+            for step_x, step_y in NEIGHBOUR_STEPS:
+                neighbour = (space[0] + step_x, space[1] + step_y)
+                if neighbour in self.distance and self.distance[neighbour] < distance:
+                    downhill.append([neighbour[0], neighbour[1]])
+            downhill.sort(key = lambda step: self.distance[(step[0], step[1])])
+            self.steps[space] = downhill
+
+    def get_steps(self, location:list|tuple) -> list:
+        # Spaces to move to from location, best first. Empty if we're there already or can't get there from here.
+        return self.steps.get((location[0], location[1]), [])
+
+
+class CabinetIndex:
+    # Every free (not busy) cabinet in a property, split up by genre and sorted into square buckets by location.
+    # Lets customers find the closest free cabinet without checking every single one.
+    def __init__(self, bucket_size:int = 8):
+        self.bucket_size = bucket_size
+        self.genres = {} # genre (None for every genre) -> {(bucket x, bucket y): {cabinet: order it was added in}}
+        self.orders = {} # cabinet -> order it was added in, for breaking ties the same way every time
+
+    def add(self, cabinet):
+        # Adds a placed cabinet. It only shows up in searches while it isn't busy.
+        self.orders[cabinet] = len(self.orders)
+        self.refresh(cabinet)
+
+    def refresh(self, cabinet):
+        # Call when a cabinet becomes busy or free.
+        if cabinet not in self.orders:
+            return
+        bucket = (cabinet.location[0] // self.bucket_size, cabinet.location[1] // self.bucket_size)
+        for genre in (None, cabinet.genre):
+            buckets = self.genres.setdefault(genre, {})
+            if cabinet.busy:
+                if cabinet in buckets.get(bucket, {}):
+                    del buckets[bucket][cabinet]
+                    if not buckets[bucket]:
+                        del buckets[bucket]
+            else:
+                buckets.setdefault(bucket, {})[cabinet] = self.orders[cabinet]
+
+    def nearest(self, location:list|tuple, genre:str|None = None):
+        # Returns the closest free cabinet to location (of the given genre, if you pick one), or None if there isn't one.
+        buckets = self.genres.get(genre)
+        if not buckets:
+            return None
+        home_x = location[0] // self.bucket_size
+        home_y = location[1] // self.bucket_size
+        # Check rings of buckets further and further out, until nothing further out could beat what we've got:
+        max_ring = max(max(abs(x - home_x), abs(y - home_y)) for x, y in buckets)
+        best = None
+        best_rank = None
+        for ring in range(max_ring + 1):
+            if best != None and best_rank[0] <= ((ring - 1) * self.bucket_size) ** 2:
+                break
+            for bucket_x in range(home_x - ring, home_x + ring + 1):
+                for bucket_y in range(home_y - ring, home_y + ring + 1):
+                    if max(abs(bucket_x - home_x), abs(bucket_y - home_y)) != ring:
+                        continue # inside this ring, we did it already
+                    for cabinet, order in buckets.get((bucket_x, bucket_y), {}).items():
+                        rank = (get_distance_squared(location, cabinet.location), order)
+                        if best_rank == None or rank < best_rank:
+                            best = cabinet
+                            best_rank = rank
+        return best
+
+
 class Property:
     # TODO: Pull data from file
-    def __init__(self, game_data) -> None:
+    def __init__(self, game_data, rng:GameRandom|None = None) -> None:
         # Pull the data from a JSON or whatever
         # but for now we only have one so just hard code it.
         self.size = [7,3] # how many tiles is it in x/y
@@ -261,25 +418,81 @@ class Property:
         self.popularity = 100 # how likely are people to come here.
         self.customers = []
         self.parent = game_data # The GameData object for our parent
+        if rng == None:
+            rng = game_data.rng if game_data != None else GameRandom()
+        self.rng = rng # handed down to customers that come in
+        self.occupancy = {} # (x, y) -> how many cabinets/customers are in that space. Keep it updated with occupy()/vacate()
+        self.flow_fields = {} # (x, y) goal -> FlowField, cleared whenever the cabinet layout changes
+        self.play_spots = set() # (x, y) of every cabinet's play locations, the only goals besides the door that get a FlowField
+        self.cabinet_index = CabinetIndex() # free cabinets, for customers looking for something to play
+        self.layout_version = 0 # goes up every time the layout changes, so anything drawn from it knows to redraw
         
     def add_cabinet(self, cabinet):
         cabinet.set_position(self.cab_positions[len(self.cabinets)], self)
         self.cabinets.append(cabinet)
+        self.cabinet_index.add(cabinet)
+        self.occupy(cabinet.location)
+        self.layout_changed()
+
+    def restore_cabinet(self, cabinet, location:list|tuple, play_locations:list|tuple):
+        # Puts a cabinet back exactly where a save says it was, play spots and all (add_cabinet works them out fresh).
+        cabinet.location = list(location)
+        cabinet.property = self
+        cabinet.play_locations = [list(spot) for spot in play_locations]
+        self.cabinets.append(cabinet)
+        self.cabinet_index.add(cabinet)
+        self.occupy(cabinet.location)
+        self.layout_changed()
+
+    def layout_changed(self):
+        # Call whenever cabinets get added, moved or removed. Old paths might go through them now.
+        self.flow_fields = {}
+        self.play_spots = set((spot[0], spot[1]) for cab in self.cabinets for spot in cab.play_locations)
+        self.layout_version += 1
+
+    def get_flow_field(self, goal:list|tuple) -> FlowField|None:
+        # Returns the (shared) paths to goal, building them if nobody's gone there since the layout changed.
+        # Only cabinet play spots and the door get paths, so there's at most one field per spot. None for anywhere else.
+        goal = (goal[0], goal[1])
+        if goal not in self.play_spots and goal != (self.exit.location[0], self.exit.location[1]):
+            return None
+        if goal not in self.flow_fields:
+            self.flow_fields[goal] = FlowField(self, goal)
+        return self.flow_fields[goal]
         
     def add_customer(self, customer):
         customer.set_location(self.exit.location)
         self.customers.append(customer)
+        self.occupy(customer.location)
         
 
     def remove_customer(self, customer):
         if customer in self.customers:
             self.customers.remove(customer)
+            self.vacate(customer.location)
+
+    def move_customer(self, customer, new_location:list|tuple):
+        # Moves a customer that's in here, keeping our occupancy up to date.
+        self.vacate(customer.location)
+        customer.location = list(new_location)
+        self.occupy(customer.location)
+
+    def occupy(self, space:list|tuple):
+        space = (space[0], space[1])
+        self.occupancy[space] = self.occupancy.get(space, 0) + 1
+
+    def vacate(self, space:list|tuple):
+        space = (space[0], space[1])
+        if self.occupancy.get(space, 0) > 1:
+            self.occupancy[space] -= 1
+        else:
+            self.occupancy.pop(space, None)
 
     def find_free_space(self, start_space:list|tuple):
         # Returns a coordinate with nothing inside of it.
         while True:
             
-            space = [randint(0,self.size[0]), randint(0, self.size[1])]
+            space = [self.rng.randint(0,self.size[0]), self.rng.randint(0, self.size[1])]
             if space == list(start_space):
                 valid_space = False
             else:
@@ -291,28 +504,23 @@ class Property:
 
 
     def is_space_empty(self, target:list):
-        is_empty = True
         if target[0] < 0 or target[0] > self.size[0] or target[1] < 0 or target[1] > self.size[1]:
             return False # Out of bounds
-        for cabinet in self.cabinets:
-            if list(cabinet.location) == target:
-                is_empty = False
-        for customer in self.customers:
-            if customer.location == target:
-                is_empty = False
-        return is_empty
+        return (target[0], target[1]) not in self.occupancy
     
-def get_distance(point_one, point_two):
-    # returns the distance between two points
-    x_dist = abs(point_one[0] - point_two[0])
-    y_dist = abs(point_one[1] - point_two[1])
-    return sqrt(x_dist ** 2 + y_dist ** 2)
+def get_distance_squared(point_one, point_two):
+    # squared distance between two points, no square root needed for comparing which one's closer.
+    x_dist = point_one[0] - point_two[0]
+    y_dist = point_one[1] - point_two[1]
+    return x_dist * x_dist + y_dist * y_dist
     
 
 
 
 class Date:
     # A single day's worth of data:
+    __slots__ = ("absolute_day", "year", "month", "day", "income", "expenses", "visitors", "income_per_cabinet")
+
     def __init__(self, absolute_day):
         self.absolute_day = absolute_day
         self.year = absolute_day // 365
@@ -331,10 +539,11 @@ class Date:
 
 
     def add_transaction(self, cabinet, amount):
-        if cabinet in self.income_per_cabinet.keys():
-            self.income_per_cabinet[cabinet] += amount
+        # income_per_cabinet is keyed by cabinet name, same as DayHistory.cabinets
+        if cabinet.name in self.income_per_cabinet:
+            self.income_per_cabinet[cabinet.name] += amount
         else:
-            self.income_per_cabinet[cabinet] = amount
+            self.income_per_cabinet[cabinet.name] = amount
         if amount > 0:
             self.income += amount
         else:
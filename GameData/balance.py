@@ -0,0 +1,152 @@
+# Balancing runner.
+# Runs lots of seeded headless games (see simulate.py) over a grid of settings, spread across CPU cores,
+# and writes a summary table as CSV, one row per combination of settings.
+# Usage (from the top folder): python -m GameData.balance --popularity 20,50,100 --capacity 2,4 --price 0.25,0.5 --runs 16 --days 30
+
+import argparse
+import csv
+import itertools
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from GameData.actors import CustomerPool
+from GameData.game import read_cabinet_list, read_customer_list
+from GameData.simulate import new_game, run_day
+
+
+PARAMETERS = ["popularity", "capacity", "price", "playtime"] # what the grid can change, in column order
+DEFAULTS = {"popularity":100, "capacity":2, "price":0.25, "playtime":5} # same as a new game
+SUMMARY_COLUMNS = PARAMETERS + [
+    "runs", "days",
+    "income_mean", "income_sd", "income_min", "income_max", # total income over the whole run
+    "daily_income_mean", "daily_visitors_mean",
+    "funds_mean", "funds_sd" # money at the end of the run
+]
+
+
+def make_grid(popularity = None, capacity = None, price = None, playtime = None) -> list:
+    # Every combination of the given values, as a list of settings dicts. Anything left out stays at the default.
+    values = {"popularity":popularity, "capacity":capacity, "price":price, "playtime":playtime}
+    choices = [values[name] if values[name] else [DEFAULTS[name]] for name in PARAMETERS]
+    return [dict(zip(PARAMETERS, combo)) for combo in itertools.product(*choices)]
+
+
+def run_one(job:tuple) -> dict:
+    # Runs one game with one set of settings. Picklable in and out, so it can go to a worker process.
+    # The game has its own seeded random numbers, so the result only depends on the job, not which worker it landed on.
+    # cabinet_row is the one cabinet list row new_game() starts us with, not the whole list.
+    settings, seed, days, cabinet_row, customer_rows = job
+    game_data = new_game([cabinet_row], seed, customer_pool = CustomerPool(customer_rows))
+    game_data.property.popularity = settings["popularity"]
+    game_data.property.capacity = settings["capacity"]
+    for cab in game_data.property.cabinets:
+        cab.price = settings["price"]
+        cab.playtime = settings["playtime"]
+    income = []
+    visitors = []
+    for i in range(days):
+        run_day(game_data)
+        income.append(game_data.current_day.income)
+        visitors.append(game_data.current_day.visitors)
+    return {"settings":settings, "seed":seed, "income":income, "visitors":visitors, "funds":game_data.money}
+
+
+def run_grid(grid:list, runs:int, days:int, seed:int = 0, workers:int|None = None, cablist:list|None = None) -> list:
+    # Runs every setting in the grid runs times. Run n of every setting uses seed + n, so settings are compared on the same luck.
+    # Returns one result per run, in grid order no matter how many workers there were.
+    if cablist == None:
+        cablist = read_cabinet_list()
+    # new_game() only uses the first cabinet, so that's all each job carries (the whole list would get pickled every time).
+    # The customer list is only a few lines, it goes along so workers don't read the file for every game.
+    customer_rows = read_customer_list()
+    jobs = [(settings, seed + n, days, cablist[0], customer_rows) for settings in grid for n in range(runs)]
+    if workers == 1:
+        return [run_one(job) for job in jobs]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        # big chunks cut down on pickling, but keep enough of them that every worker stays busy
+        chunk_size = max(1, len(jobs) // (workers * 4))
+        return list(pool.map(run_one, jobs, chunksize = chunk_size))
+
+
+def summarise(results:list) -> list:
+    # Boils the per-run results down to one row per setting, with the columns in SUMMARY_COLUMNS.
+    groups = {}
+    for result in results:
+        key = tuple(result["settings"][name] for name in PARAMETERS)
+        groups.setdefault(key, []).append(result)
+    rows = []
+    for key, group in groups.items():
+        totals = [sum(result["income"]) for result in group]
+        funds = [result["funds"] for result in group]
+        days = len(group[0]["income"])
+        day_count = max(1, days * len(group))
+        row = dict(zip(PARAMETERS, key))
+        row.update({
+            "runs":len(group),
+            "days":days,
+            "income_mean":statistics.mean(totals),
+            "income_sd":statistics.pstdev(totals),
+            "income_min":min(totals),
+            "income_max":max(totals),
+            "daily_income_mean":sum(totals) / day_count,
+            "daily_visitors_mean":sum(sum(result["visitors"]) for result in group) / day_count,
+            "funds_mean":statistics.mean(funds),
+            "funds_sd":statistics.pstdev(funds)
+        })
+        rows.append(row)
+    return rows
+
+
+def write_csv(rows:list, path:str, columns:list = SUMMARY_COLUMNS):
+    with open(path, "w", newline = "") as out_file:
+        writer = csv.DictWriter(out_file, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_runs_csv(results:list, path:str):
+    # Every day of every run, one row each. Handy for plotting.
+    with open(path, "w", newline = "") as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(PARAMETERS + ["seed", "day", "income", "visitors"])
+        for result in results:
+            settings = [result["settings"][name] for name in PARAMETERS]
+            for day, (income, visitors) in enumerate(zip(result["income"], result["visitors"])):
+                writer.writerow(settings + [result["seed"], day, income, visitors])
+
+
+def number_list(text:str) -> list:
+    # "1,2,3" -> [1, 2, 3], keeps whole numbers as ints
+    return [float(value) if "." in value else int(value) for value in text.split(",") if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run seeded headless games over a grid of settings and summarise them.")
+    parser.add_argument("--popularity", type = number_list, default = None, help = "comma separated Property.popularity values")
+    parser.add_argument("--capacity", type = number_list, default = None, help = "comma separated Property.capacity values")
+    parser.add_argument("--price", type = number_list, default = None, help = "comma separated Cabinet.price values")
+    parser.add_argument("--playtime", type = number_list, default = None, help = "comma separated Cabinet.playtime values")
+    parser.add_argument("--runs", type = int, default = 8, help = "games per setting")
+    parser.add_argument("--days", type = int, default = 30, help = "days per game")
+    parser.add_argument("--seed", type = int, default = 0, help = "first seed, run n of each setting uses seed + n")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes (default: one per core, 1 = no pool)")
+    parser.add_argument("--out", default = "balance.csv", help = "summary CSV to write")
+    parser.add_argument("--runs-out", default = None, help = "also write every day of every run to this CSV")
+    args = parser.parse_args()
+
+    grid = make_grid(args.popularity, args.capacity, args.price, args.playtime)
+    start_time = time.perf_counter()
+    results = run_grid(grid, args.runs, args.days, args.seed, args.workers)
+    elapsed = time.perf_counter() - start_time
+    write_csv(summarise(results), args.out)
+    if args.runs_out:
+        write_runs_csv(results, args.runs_out)
+    game_days = len(results) * args.days
+    print(f"{len(grid)} settings x {args.runs} runs x {args.days} days in {elapsed:.2f}s ({game_days / elapsed:.1f} game days/s)")
+    print(f"Summary written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
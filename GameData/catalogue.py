@@ -0,0 +1,298 @@
+# The cabinet catalogue.
+# cabinetlist.csv (or a mod pack's list) gets compiled once into a binary cache next to it, then every launch just
+# memory-maps the cache. Nothing is read until it's asked for, and Cabinets only get made when someone wants one.
+# The cache has sorted orders for release, players, genre and name, so those queries are a binary search instead
+# of a walk over every cabinet.
+#
+# Cache layout (all little-endian): HEADER, then the sections in SECTIONS order, each starting on an 8 byte boundary.
+# The header has the source file's size, mtime and SHA-1, so an edited list gets recompiled. If only the mtime
+# changed (copied, touched, checked out again) the hash still matches and the old cache is kept.
+
+import bisect
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from GameData.actors import Cabinet
+
+
+CABINET_FILE = "GameData/cabinetlist.csv"
+CACHE_MAGIC = b"ARCADECT"
+CACHE_VERSION = 1
+COMPILE_BATCH_SIZE = 1024 # rows parsed between yields in compile_steps()
+
+# section name -> array typecode ("B" sections are raw bytes)
+SECTIONS = {
+    "release":"i", # release year of each cabinet
+    "players":"i",
+    "genre":"H", # index into the genre list
+    "text_offsets":"I", # name i is text[offsets[2i]:offsets[2i+1]], its description runs to offsets[2i+2]
+    "release_order":"I", # cabinet numbers sorted by release, then number
+    "players_order":"I",
+    "genre_order":"I",
+    "name_order":"I", # sorted by casefolded name
+    "genres":"B", # genre names, utf-8, one per line
+    "text":"B" # every name and description, utf-8
+}
+# magic, version, count, source size, source mtime (ns), source SHA-1, then (offset, length) for every section
+HEADER = struct.Struct("<8sHxxIQq20s4x" + "QQ" * len(SECTIONS))
+STAMP_OFFSET = 16 # where the source size/mtime start in the header, so they can be updated in place
+
+
+def file_hash(path:str) -> bytes:
+    with open(path, "rb") as source:
+        return hashlib.sha1(source.read()).digest()
+
+
+def cache_path_for(path:str) -> str:
+    return os.path.splitext(path)[0] + ".cache"
+
+
+class Catalogue:
+    # Read-only view of a compiled cabinet list. Cabinets are numbered in file order, from 0.
+    # Usage: is_fresh() / compile() if it isn't / open(), or just load() to do all of that in one go.
+    def __init__(self, path:str = CABINET_FILE, cache_path:str|None = None):
+        self.path = path
+        self.cache_path = cache_path or cache_path_for(path)
+        self.count = 0
+        self.file = None
+        self.map = None
+        self.data = None # memoryview over the mapped cache, or over compiled bytes if the cache couldn't be written
+        self.sections = {}
+        self.genre_names = []
+
+    def __len__(self):
+        return self.count
+
+    # Building the cache:
+
+    def is_fresh(self) -> bool:
+        # Is the cache there and made from the current source file?
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                header = cache_file.read(HEADER.size)
+            source = os.stat(self.path)
+        except OSError:
+            return False
+        if len(header) < HEADER.size:
+            return False
+        magic, version, count, size, mtime, digest = HEADER.unpack(header)[:6]
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return False
+        if size == source.st_size and mtime == source.st_mtime_ns:
+            return True
+        if size != source.st_size or digest != file_hash(self.path):
+            return False
+        # same contents, new mtime: remember the new one so we don't hash it every time
+        try:
+            with open(self.cache_path, "r+b") as cache_file:
+                cache_file.seek(STAMP_OFFSET)
+                cache_file.write(struct.pack("<Qq", source.st_size, source.st_mtime_ns))
+        except OSError:
+            pass
+        return True
+
+    def compile_steps(self):
+        # Generator: parses the source a batch at a time, yielding (bytes read, file size) so a loading screen can
+        # show it, then writes the cache. If the cache can't be written we keep the compiled bytes and use those.
+        source = os.stat(self.path)
+        total = max(1, source.st_size)
+        digest = hashlib.sha1()
+        columns = {name:array(typecode) for name, typecode in SECTIONS.items()}
+        text = bytearray()
+        offsets = columns["text_offsets"]
+        genre_numbers = {}
+        names = []
+        count = 0
+        with open(self.path, "rb") as source_file:
+            def lines():
+                for line in source_file:
+                    digest.update(line)
+                    yield line.decode()
+            for row in csv.reader(lines(), delimiter = ";"):
+                if len(row) == 0:
+                    continue
+                name, description, release, genre, players = row[:5]
+                offsets.append(len(text))
+                text += name.encode("utf-8")
+                offsets.append(len(text))
+                text += description.encode("utf-8")
+                columns["release"].append(int(release))
+                columns["players"].append(int(players))
+                columns["genre"].append(genre_numbers.setdefault(genre, len(genre_numbers)))
+                names.append(name.casefold())
+                count += 1
+                if count % COMPILE_BATCH_SIZE == 0:
+                    yield min(source_file.tell(), total), total
+        offsets.append(len(text))
+        numbers = range(count)
+        # sorted() is stable, so equal values stay in file order. Each sort is a step of its own, they add up.
+        for column in ["release", "players", "genre"]:
+            columns[column + "_order"].extend(sorted(numbers, key = columns[column].__getitem__))
+            yield total, total
+        columns["name_order"].extend(sorted(numbers, key = names.__getitem__))
+        columns["genres"].frombytes("\n".join(genre_numbers).encode("utf-8"))
+        columns["text"].frombytes(bytes(text))
+        yield total, total
+
+        data = self.pack(count, source, digest.digest(), columns)
+        try:
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(data)
+            os.replace(temp_path, self.cache_path)
+        except OSError as error:
+            print(f"Couldn't write the cabinet cache ({error}), using it from memory")
+            self.close()
+            self.use_data(memoryview(data))
+        yield total, total
+
+    def compile(self):
+        for progress in self.compile_steps():
+            pass
+
+    def pack(self, count:int, source:os.stat_result, digest:bytes, columns:dict) -> bytes:
+        parts = []
+        places = []
+        position = HEADER.size
+        for name in SECTIONS:
+            values = columns[name]
+            if sys.byteorder == "big" and values.itemsize > 1:
+                values = array(values.typecode, values)
+                values.byteswap()
+            padding = -position % 8
+            parts.append(bytes(padding))
+            position += padding
+            data = values.tobytes()
+            places += [position, len(data)]
+            parts.append(data)
+            position += len(data)
+        header = HEADER.pack(CACHE_MAGIC, CACHE_VERSION, count, source.st_size, source.st_mtime_ns, digest, *places)
+        return header + b"".join(parts)
+
+    # Opening:
+
+    def open(self):
+        # Maps the cache file. Only the header gets read now, the rest gets paged in as it's used.
+        if self.data != None:
+            return
+        self.file = open(self.cache_path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        self.use_data(memoryview(self.map))
+
+    def use_data(self, data:memoryview):
+        header = HEADER.unpack_from(data)
+        self.count = header[2]
+        places = header[6:]
+        self.sections = {}
+        for i, (name, typecode) in enumerate(SECTIONS.items()):
+            start = places[i * 2]
+            section = data[start:start + places[i * 2 + 1]]
+            if typecode == "B":
+                self.sections[name] = section
+            elif sys.byteorder == "big":
+                values = array(typecode, section.tobytes())
+                values.byteswap()
+                self.sections[name] = values
+            else:
+                self.sections[name] = section.cast(typecode)
+        self.data = data
+        self.genre_names = bytes(self.sections["genres"]).decode("utf-8").split("\n") if self.count else []
+
+    def load(self):
+        # Compiles the cache if it's stale, then opens it.
+        if self.data == None and not self.is_fresh():
+            self.compile()
+        self.open()
+
+    def close(self):
+        # Drops every view into the cache before unmapping, mmap won't close while they're around.
+        for section in self.sections.values():
+            if type(section) == memoryview:
+                section.release()
+        self.sections = {}
+        if self.data != None:
+            self.data.release()
+            self.data = None
+        if self.map != None:
+            self.map.close()
+            self.map = None
+        if self.file != None:
+            self.file.close()
+            self.file = None
+        self.count = 0
+
+    # One cabinet:
+
+    def name(self, number:int) -> str:
+        offsets = self.sections["text_offsets"]
+        return str(self.sections["text"][offsets[number * 2]:offsets[number * 2 + 1]], "utf-8")
+
+    def description(self, number:int) -> str:
+        offsets = self.sections["text_offsets"]
+        return str(self.sections["text"][offsets[number * 2 + 1]:offsets[number * 2 + 2]], "utf-8")
+
+    def release(self, number:int) -> int:
+        return self.sections["release"][number]
+
+    def players(self, number:int) -> int:
+        return self.sections["players"][number]
+
+    def genre(self, number:int) -> str:
+        return self.genre_names[self.sections["genre"][number]]
+
+    def row(self, number:int) -> list:
+        # Same as a line of the csv, which is what Cabinet() wants
+        return [self.name(number), self.description(number), str(self.release(number)), self.genre(number), str(self.players(number))]
+
+    def cabinet(self, number:int) -> Cabinet:
+        # A brand new Cabinet every time, they keep their own position/plays/etc.
+        return Cabinet(self.row(number))
+
+    # Queries, these all return cabinet numbers:
+
+    def between(self, column:str, low, high) -> list:
+        # Everything with low <= column <= high, in column order
+        values = self.sections[column]
+        order = self.sections[column + "_order"]
+        start = bisect.bisect_left(order, low, key = lambda i: values[i])
+        end = bisect.bisect_right(order, high, key = lambda i: values[i])
+        return order[start:end].tolist()
+
+    def by_release(self, first:int, last:int|None = None) -> list:
+        # Released from first to last (inclusive), oldest first. Leave last out for just the one year.
+        return self.between("release", first, first if last == None else last)
+
+    def by_players(self, low:int, high:int|None = None) -> list:
+        return self.between("players", low, low if high == None else high)
+
+    def by_genre(self, genre:str) -> list:
+        if genre not in self.genre_names:
+            return []
+        number = self.genre_names.index(genre)
+        return self.between("genre", number, number)
+
+    def by_name_prefix(self, prefix:str) -> list:
+        # Names starting with prefix, ignoring case, in alphabetical order
+        prefix = prefix.casefold()
+        order = self.sections["name_order"]
+        start = bisect.bisect_left(order, prefix, key = lambda i: self.name(i).casefold())
+        found = []
+        for number in order[start:]:
+            if not self.name(number).casefold().startswith(prefix):
+                break
+            found.append(number)
+        return found
+
+    def find(self, name:str) -> int|None:
+        # Cabinet number for an exact name, or None
+        for number in self.by_name_prefix(name):
+            if self.name(number) == name:
+                return number
+        return None
+
+    def genres(self) -> list:
+        return list(self.genre_names)
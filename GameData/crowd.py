@@ -0,0 +1,424 @@
+# Crowd-sized customer simulation.
+# Instead of a Customer object each, every customer is a slot in a set of NumPy arrays (location, target, state, timers,
+# money, patience), and a tick updates all of them at once with masks. Same rules as Customer.do_action, see CrowdSim.step.
+# Needs NumPy, which the rest of the game doesn't. Benchmark: python -m GameData.crowd
+
+import time
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Customer states, same as the strings Customer.state uses:
+ENTER = 0
+WANDER = 1
+MOVE = 2
+PLAY = 3
+WAIT = 4
+LEAVE = 5
+GONE = 6 # empty slot, free for a new customer
+STATE_NAMES = ["ENTER", "WANDER", "MOVE", "PLAY", "WAIT", "LEAVE", "GONE"]
+
+MAX_PLAY_LOCATIONS = 4 # Cabinet.set_position never makes more than this
+BUCKET_SIZE = 8 # size of the squares cabinets get sorted into, for finding the closest one
+
+
+class CrowdSim:
+    # All of a property's customers, stored as arrays.
+    # Differences from looping over Customer objects, since everyone moves at once:
+    # - Customers step straight towards their target (sidestepping on one axis if that's blocked), not along FlowFields.
+    # - Everyone finishes their game before anyone starts one, and a space someone walks out of can only be
+    #   taken by someone trying a worse step later in the same tick.
+    # - If more people reach a cabinet in one tick than it has room for, the first ones (by slot) play and the rest wander off.
+    def __init__(self, active_property, capacity:int = 64, seed:int|None = None):
+        if np == None:
+            raise ImportError("CrowdSim needs NumPy installed")
+        self.property = active_property
+        self.rng = np.random.default_rng(seed)
+        self.width = active_property.size[0] + 1 # property size is the last valid coordinate, not the count
+        self.height = active_property.size[1] + 1
+        self.door = np.array(active_property.exit.location, dtype = np.int32)
+        self.genre_ids = {} # genre name -> number
+        self.load_cabinets(active_property.cabinets)
+
+        # Customers:
+        self.count = 0 # slots used so far, some of them might be GONE
+        self.location = np.zeros((capacity, 2), dtype = np.int32)
+        self.target_loc = np.zeros((capacity, 2), dtype = np.int32)
+        self.target = np.full(capacity, -1, dtype = np.int32) # cabinet number, -1 for none
+        self.state = np.full(capacity, GONE, dtype = np.int8)
+        self.act_timer = np.zeros(capacity, dtype = np.int32)
+        self.money = np.zeros(capacity, dtype = np.float64)
+        self.patience = np.zeros(capacity, dtype = np.int32)
+        self.preference = np.zeros(capacity, dtype = np.int32)
+
+        # How many things are in each space, cabinets included. Indexed [x, y]
+        self.occupancy = np.zeros((self.width, self.height), dtype = np.int32)
+        self.occupancy[self.cab_loc[:, 0], self.cab_loc[:, 1]] += 1
+
+    def get_genre_id(self, genre:str) -> int:
+        if genre not in self.genre_ids:
+            self.genre_ids[genre] = len(self.genre_ids)
+        return self.genre_ids[genre]
+
+    def load_cabinets(self, cabinets:list):
+        # Copies the property's (already placed) cabinets into arrays.
+        count = len(cabinets)
+        self.cabinets = cabinets
+        self.cab_loc = np.array([cab.location for cab in cabinets], dtype = np.int32).reshape(count, 2)
+        self.cab_genre = np.array([self.get_genre_id(cab.genre) for cab in cabinets], dtype = np.int32)
+        self.cab_players = np.array([cab.players for cab in cabinets], dtype = np.int32)
+        self.cab_price = np.array([cab.price for cab in cabinets], dtype = np.float64)
+        self.cab_current = np.array([cab.current_players for cab in cabinets], dtype = np.int32)
+        self.cab_busy = np.array([cab.busy for cab in cabinets], dtype = bool)
+        self.cab_next_play_pos = np.array([cab.next_play_pos for cab in cabinets], dtype = np.int32)
+        self.cab_plays = np.zeros(count, dtype = np.int64)
+        self.cab_income = np.zeros(count, dtype = np.float64)
+        self.cab_play_count = np.array([len(cab.play_locations) for cab in cabinets], dtype = np.int32)
+        self.cab_playtime = np.array([cab.playtime for cab in cabinets], dtype = np.int32)
+        self.cab_play_locations = np.zeros((count, MAX_PLAY_LOCATIONS, 2), dtype = np.int32)
+        for i, cab in enumerate(cabinets):
+            for j, play_loc in enumerate(cab.play_locations[0:MAX_PLAY_LOCATIONS]):
+                self.cab_play_locations[i, j] = play_loc
+        self.build_cabinet_buckets()
+
+    def grow(self, capacity:int):
+        # Makes room for more customers.
+        extra = capacity - len(self.state)
+        self.location = np.concatenate([self.location, np.zeros((extra, 2), dtype = np.int32)])
+        self.target_loc = np.concatenate([self.target_loc, np.zeros((extra, 2), dtype = np.int32)])
+        self.target = np.concatenate([self.target, np.full(extra, -1, dtype = np.int32)])
+        self.state = np.concatenate([self.state, np.full(extra, GONE, dtype = np.int8)])
+        self.act_timer = np.concatenate([self.act_timer, np.zeros(extra, dtype = np.int32)])
+        self.money = np.concatenate([self.money, np.zeros(extra, dtype = np.float64)])
+        self.patience = np.concatenate([self.patience, np.zeros(extra, dtype = np.int32)])
+        self.preference = np.concatenate([self.preference, np.zeros(extra, dtype = np.int32)])
+
+    def spawn(self, count:int = 1, profile = None):
+        # Brings count new customers in through the door, all made from one CustomerProfile (DEFAULT_PROFILE if not given).
+        if profile == None:
+            from GameData.actors import DEFAULT_PROFILE
+            profile = DEFAULT_PROFILE
+        if self.count + count > len(self.state):
+            self.grow(max(self.count + count, len(self.state) * 2))
+        new = slice(self.count, self.count + count)
+        self.location[new] = self.door
+        self.target_loc[new] = 0
+        self.target[new] = -1
+        self.state[new] = ENTER
+        self.act_timer[new] = 0
+        self.money[new] = profile.money
+        self.patience[new] = profile.patience
+        self.preference[new] = self.get_genre_id(profile.preference)
+        self.occupancy[self.door[0], self.door[1]] += count
+        self.count += count
+
+    def spawn_from_pool(self, pool, count:int = 1):
+        # Brings count customers in, each picked by weight from a CustomerPool like GameData.add_customer does.
+        picks = np.searchsorted(pool.cumulative, self.rng.random(count) * pool.cumulative[-1], side = "right")
+        picks = np.minimum(picks, len(pool.profiles) - 1)
+        for pick, picked in zip(*np.unique(picks, return_counts = True)):
+            self.spawn(int(picked), pool.profiles[pick])
+
+    def population(self) -> int:
+        return int(np.count_nonzero(self.state[0:self.count] != GONE))
+
+    def step(self) -> dict:
+        # One movement tick for everyone, following Customer.do_action. Returns how many of each event happened.
+        n = self.count
+        state = self.state[0:n]
+        target = self.target[0:n]
+        act_timer = self.act_timer[0:n]
+        events = {"FINISH":0, "PLAYSTART":0, "WAIT_BAD":0, "LEFT":0, "INCOME":0.0}
+
+        # Playing: count down, get up when the game's done.
+        playing = state == PLAY
+        act_timer[playing] -= 1
+        finished = np.flatnonzero(playing & (act_timer < 1) & (target >= 0))
+        if len(finished):
+            self.end_play(finished)
+            state[finished] = WANDER
+            target[finished] = -1
+            act_timer[finished] = 3 # wander for 3 ticks before playing again
+            events["FINISH"] = len(finished)
+
+        # Waiting: lose patience while our cabinet is busy, give up if it's been too long.
+        waiting = state == WAIT
+        act_timer[waiting] += 1
+        waiting_busy = waiting & (target >= 0)
+        if len(self.cabinets):
+            waiting_busy &= self.cab_busy[np.maximum(target, 0)]
+        self.patience[0:n][waiting_busy] -= act_timer[waiting_busy]
+        gave_up = np.flatnonzero(waiting_busy & (act_timer > self.patience[0:n] // 10))
+        events["WAIT_BAD"] = len(gave_up)
+
+        # Wandering (or nothing to do): count down, wander a step, look for a cabinet once we're done.
+        wandering = ~playing & ~waiting & (state != GONE) & ((state == WANDER) | (target < 0))
+        act_timer[wandering] -= 1
+        wander_now = np.flatnonzero(wandering)
+        look_now = np.flatnonzero(wandering & (act_timer < 1))
+
+        # Heading to a cabinet: give up if someone beat us to it, otherwise walk.
+        heading = np.flatnonzero(~wandering & (state == MOVE) & (target >= 0))
+        beaten = heading[self.cab_busy[target[heading]]]
+        state[beaten] = WANDER
+        self.patience[beaten] -= 5
+        heading = heading[~self.cab_busy[target[heading]]]
+        leaving = np.flatnonzero(~wandering & (state == LEAVE) & (target >= 0))
+
+        # Everyone who's wandering picks a random spot, then all the walkers take a step together:
+        wanderers = np.concatenate([finished, wander_now])
+        self.target_loc[wanderers, 0] = self.rng.integers(0, self.width, len(wanderers))
+        self.target_loc[wanderers, 1] = self.rng.integers(0, self.height, len(wanderers))
+        self.move_to_targets(np.concatenate([wanderers, heading, leaving]))
+
+        # Find new cabinets for anyone who's done wandering or gave up waiting:
+        self.get_new_targets(np.concatenate([look_now, gave_up]))
+
+        # Arrivals:
+        arrived = heading[(self.location[heading] == self.target_loc[heading]).all(axis = 1)]
+        if len(arrived):
+            started = self.start_play(arrived)
+            events["PLAYSTART"] = len(started)
+            events["INCOME"] = float(self.cab_price[target[started]].sum())
+        left = leaving[(self.location[leaving] == self.target_loc[leaving]).all(axis = 1)]
+        if len(left):
+            np.subtract.at(self.occupancy, (self.location[left, 0], self.location[left, 1]), 1)
+            state[left] = GONE
+            events["LEFT"] = len(left)
+        return events
+
+    def end_play(self, customers):
+        # Cabinet.end_play for a bunch of customers at once.
+        cabs = self.target[customers]
+        self.cab_busy[cabs] = False
+        np.subtract.at(self.cab_current, cabs, 1)
+        # Free up their play spot for the next person:
+        spots = (self.cab_play_locations[cabs] == self.location[customers][:, None, :]).all(axis = 2)
+        spot_index = np.where(spots.any(axis = 1), spots.argmax(axis = 1), MAX_PLAY_LOCATIONS)
+        np.minimum.at(self.cab_next_play_pos, cabs, spot_index.astype(np.int32))
+
+    def start_play(self, customers):
+        # Cabinet.start_play for everyone who reached their cabinet. If too many turned up, the first ones get it.
+        # Returns the customers who actually started playing.
+        cabs = self.target[customers]
+        order = np.lexsort((customers, cabs))
+        customers = customers[order]
+        cabs = cabs[order]
+        # Where each customer is in line for their cabinet:
+        first_in_line = np.r_[0, np.flatnonzero(np.diff(cabs)) + 1]
+        line_start = np.repeat(first_in_line, np.diff(np.r_[first_in_line, len(cabs)]))
+        place_in_line = np.arange(len(cabs)) - line_start
+        gets_to_play = place_in_line < self.cab_players[cabs] - self.cab_current[cabs]
+
+        too_late = customers[~gets_to_play]
+        self.state[too_late] = WANDER
+        self.patience[too_late] -= 5
+
+        customers = customers[gets_to_play]
+        cabs = cabs[gets_to_play]
+        self.state[customers] = PLAY
+        self.act_timer[customers] = self.cab_playtime[cabs]
+        np.add.at(self.cab_current, cabs, 1)
+        np.add.at(self.cab_next_play_pos, cabs, 1)
+        np.add.at(self.cab_plays, cabs, 1)
+        np.add.at(self.cab_income, cabs, self.cab_price[cabs])
+        self.cab_busy |= self.cab_current >= self.cab_players
+        self.money[customers] -= self.cab_price[cabs]
+        return np.sort(customers)
+
+    def get_new_targets(self, customers):
+        # Customer.get_new_target for a bunch of customers: closest free cabinet in their favourite genre,
+        # or the closest free one if there's none of those. Ties go to the first cabinet placed.
+        if len(customers) == 0:
+            return
+        choice = self.nearest_cabinets(customers, True)
+        has_favourite = choice >= 0
+        no_favourite = np.flatnonzero(~has_favourite)
+        choice[no_favourite] = self.nearest_cabinets(customers[no_favourite], False)
+        found = choice >= 0
+
+        self.target[customers[~found]] = -1
+        self.state[customers[~found]] = WANDER
+        customers = customers[found]
+        choice = choice[found]
+        self.state[customers] = MOVE
+        self.target[customers] = choice
+        play_pos = np.minimum(self.cab_next_play_pos[choice], self.cab_play_count[choice] - 1)
+        self.target_loc[customers] = self.cab_play_locations[choice, play_pos]
+        self.patience[customers[has_favourite[found]]] += 1 # make us a little happier if we see our faves!!
+
+    def build_cabinet_buckets(self):
+        # Sorts cabinets into BUCKET_SIZE squares, so nearest_cabinets only has to check the ones close by.
+        self.buckets_across = self.width // BUCKET_SIZE + 1
+        bucket_count = self.buckets_across * (self.height // BUCKET_SIZE + 1)
+        bucket_ids = (self.cab_loc[:, 1] // BUCKET_SIZE) * self.buckets_across + self.cab_loc[:, 0] // BUCKET_SIZE
+        per_bucket = np.bincount(bucket_ids, minlength = bucket_count)
+        # bucket_table[bucket] is a row of the cabinet numbers in that bucket, padded with -1
+        self.bucket_table = np.full((bucket_count, max(1, per_bucket.max(initial = 0))), -1, dtype = np.int32)
+        order = np.argsort(bucket_ids, kind = "stable")
+        sorted_ids = bucket_ids[order]
+        slot = np.arange(len(order)) - (np.cumsum(per_bucket) - per_bucket)[sorted_ids]
+        self.bucket_table[sorted_ids, slot] = order
+
+    def nearest_cabinets(self, customers, favourites_only:bool, chunk_size:int = 4096):
+        # Closest free cabinet for each customer (only their favourite genre if favourites_only), -1 if there isn't one.
+        # Checks rings of buckets further and further out from each customer's own bucket, like CabinetIndex.nearest.
+        # Once a customer has something within ring * BUCKET_SIZE, nothing further out can beat it and they stop looking.
+        choice = np.full(len(customers), -1, dtype = np.int32)
+        if len(customers) == 0 or len(self.cabinets) == 0:
+            return choice
+        # Nobody goes looking for a genre with no free cabinets anywhere, they'd search every ring for nothing:
+        free_genres = np.zeros(len(self.genre_ids), dtype = bool)
+        free_genres[self.cab_genre[~self.cab_busy]] = True
+        if favourites_only:
+            searching = np.flatnonzero(free_genres[self.preference[customers]])
+        else:
+            searching = np.arange(len(customers)) if free_genres.any() else np.arange(0)
+        best_distance = np.full(len(customers), np.iinfo(np.int64).max, dtype = np.int64)
+        location = self.location[customers]
+        bucket_x = location[:, 0] // BUCKET_SIZE
+        bucket_y = location[:, 1] // BUCKET_SIZE
+        buckets_down = len(self.bucket_table) // self.buckets_across
+        for ring in range(max(self.buckets_across, buckets_down)):
+            for start in range(0, len(searching), chunk_size):
+                chunk = searching[start:start + chunk_size]
+                candidates = self.ring_candidates(bucket_x[chunk], bucket_y[chunk], ring, buckets_down)
+                found, distance = self.closest_of(customers[chunk], candidates, favourites_only)
+                # ties go to the lower cabinet number, same as closest_of
+                better = (found >= 0) & ((distance < best_distance[chunk]) | ((distance == best_distance[chunk]) & (found < choice[chunk])))
+                choice[chunk[better]] = found[better]
+                best_distance[chunk[better]] = distance[better]
+            # Everything outside this ring is more than ring * BUCKET_SIZE away:
+            searching = searching[best_distance[searching] > (ring * BUCKET_SIZE) ** 2]
+            if len(searching) == 0:
+                break
+        return choice
+
+    def ring_candidates(self, bucket_x, bucket_y, ring:int, buckets_down:int):
+        # The cabinets in the buckets exactly ring away from each customer's bucket, one row per customer, padded with -1.
+        if ring == 0:
+            offset_x = np.zeros(1, dtype = np.int32)
+            offset_y = np.zeros(1, dtype = np.int32)
+        else:
+            side = np.arange(-ring, ring + 1, dtype = np.int32)
+            inner = side[1:-1]
+            offset_x = np.concatenate([side, side, np.full(len(inner), -ring), np.full(len(inner), ring)])
+            offset_y = np.concatenate([np.full(len(side), -ring), np.full(len(side), ring), inner, inner])
+        x = bucket_x[:, None] + offset_x
+        y = bucket_y[:, None] + offset_y
+        real = (x >= 0) & (x < self.buckets_across) & (y >= 0) & (y < buckets_down)
+        rows = self.bucket_table[np.where(real, y * self.buckets_across + x, 0)]
+        return np.where(real[:, :, None], rows, -1).reshape(len(bucket_x), -1)
+
+    def closest_of(self, customers, candidates, favourites_only:bool):
+        # Picks the closest allowed cabinet for each customer from their row of candidates (-1 = no cabinet).
+        # Returns the cabinet numbers (-1 if none) and their squared distances.
+        cabs = np.maximum(candidates, 0)
+        allowed = (candidates >= 0) & ~self.cab_busy[cabs]
+        if favourites_only:
+            allowed &= self.cab_genre[cabs] == self.preference[customers][:, None]
+        offset = self.cab_loc[cabs] - self.location[customers][:, None, :]
+        distance = (offset * offset).sum(axis = 2).astype(np.int64)
+        # rank by distance, then by cabinet number so ties always go the same way:
+        rank = np.where(allowed, distance * len(self.cabinets) + cabs, np.iinfo(np.int64).max)
+        best = rank.argmin(axis = 1)
+        rows = np.arange(len(customers))
+        found = allowed[rows, best]
+        best_cab = np.where(found, cabs[rows, best], -1).astype(np.int32)
+        best_distance = np.where(found, distance[rows, best], np.iinfo(np.int64).max)
+        return best_cab, best_distance
+
+    def move_to_targets(self, customers):
+        # One step towards each customer's target_loc. The straight line step first, then each axis on its own.
+        # Nobody walks into a space that's taken, and if two people want the same space, the first one gets it.
+        if len(customers) == 0:
+            return
+        customers = np.sort(customers)
+        step = np.sign(self.target_loc[customers] - self.location[customers]).astype(np.int32)
+        moved = np.zeros(len(customers), dtype = bool)
+        for use_x, use_y in ((1, 1), (1, 0), (0, 1)):
+            try_step = step * np.array([use_x, use_y], dtype = np.int32)
+            trying = ~moved & try_step.any(axis = 1)
+            if not use_x or not use_y: # axis-only steps only count if that axis actually moves
+                trying &= try_step[:, 0 if use_x else 1] != 0
+            tries = np.flatnonzero(trying)
+            if len(tries) == 0:
+                continue
+            new_loc = self.location[customers[tries]] + try_step[tries]
+            in_bounds = (new_loc[:, 0] >= 0) & (new_loc[:, 0] < self.width) & (new_loc[:, 1] >= 0) & (new_loc[:, 1] < self.height)
+            tries = tries[in_bounds]
+            new_loc = new_loc[in_bounds]
+            empty = self.occupancy[new_loc[:, 0], new_loc[:, 1]] == 0
+            tries = tries[empty]
+            new_loc = new_loc[empty]
+            # First come first served:
+            space_ids = new_loc[:, 1] * self.width + new_loc[:, 0]
+            space_ids, first = np.unique(space_ids, return_index = True)
+            tries = tries[first]
+            new_loc = new_loc[first]
+            movers = customers[tries]
+            np.subtract.at(self.occupancy, (self.location[movers, 0], self.location[movers, 1]), 1)
+            self.occupancy[new_loc[:, 0], new_loc[:, 1]] += 1
+            self.location[movers] = new_loc
+            moved[tries] = True
+
+    def sync_cabinets(self):
+        # Copies cabinet play counts/income into the Cabinet objects' day data, and resets ours.
+        for i, cab in enumerate(self.cabinets):
+            cab.day_data["Plays"] += int(self.cab_plays[i])
+            cab.day_data["Income"] += float(self.cab_income[i])
+            cab.current_players = int(self.cab_current[i])
+            cab.busy = bool(self.cab_busy[i])
+            cab.next_play_pos = int(self.cab_next_play_pos[i])
+        self.cab_plays[:] = 0
+        self.cab_income[:] = 0
+
+
+def make_test_property(customer_count:int):
+    # A big empty room with a grid of cabinets, roomy enough for customer_count people.
+    from GameData.actors import Property, Cabinet
+    side = int((customer_count * 4) ** 0.5) + 10
+    test_property = Property(None)
+    test_property.size = [side, side]
+    test_property.exit.location = [side // 2, 0]
+    spacing = 6
+    test_property.cab_positions = [[x, y] for y in range(3, side - 2, spacing) for x in range(3, side - 2, spacing)]
+    test_property.cab_positions = test_property.cab_positions[0:max(1, customer_count // 20)]
+    genres = ["MAZE", "PLATFORM", "FIGHTING", "ACTION"]
+    for i in range(len(test_property.cab_positions)):
+        test_property.add_cabinet(Cabinet([f"CAB {i}", "", "0", genres[i % len(genres)], str(1 + i % 2)]))
+    return test_property
+
+
+def benchmark(customer_counts = (10, 1000, 100000), ticks:int = 50, object_limit:int = 10):
+    # Customer-steps per second for the array version, and for plain Customer objects up to object_limit customers.
+    # (objects get slow fast: 1000 of them wandering around the test property takes ~13s a tick, mostly building flow fields)
+    from GameData.actors import Customer
+    for count in customer_counts:
+        crowd = CrowdSim(make_test_property(count), seed = 1)
+        crowd.spawn(count)
+        start = time.perf_counter()
+        for i in range(ticks):
+            crowd.step()
+        elapsed = time.perf_counter() - start
+        print(f"{count:>7} customers, arrays:  {count * ticks / elapsed:>12,.0f} customer-steps/s ({elapsed / ticks * 1000:.2f} ms/tick)")
+        if count > object_limit:
+            continue
+        test_property = make_test_property(count)
+        customers = []
+        for i in range(count):
+            customer = Customer(test_property)
+            test_property.add_customer(customer)
+            customers.append(customer)
+        start = time.perf_counter()
+        for i in range(ticks):
+            for customer in customers:
+                customer.do_action()
+        elapsed = time.perf_counter() - start
+        print(f"{count:>7} customers, objects: {count * ticks / elapsed:>12,.0f} customer-steps/s ({elapsed / ticks * 1000:.2f} ms/tick)")
+
+
+if __name__ == "__main__":
+    benchmark()
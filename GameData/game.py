@@ -3,8 +3,13 @@ from engine import *
 from ui import *
 from GameData.windows import *
 from GameData.actors import *
-import random
+from GameData.rng import GameRandom
+from GameData.history import DayHistory
+from GameData.saves import SAVE_FILE, SaveError, Autosaver, read_snapshot, restore, save_game
+from GameData.catalogue import CABINET_FILE, Catalogue
+import os
 import csv
+import heapq
 
 
 
@@ -13,22 +18,95 @@ DAY_START = 0
 DAY_RUN = 1
 DAY_END = 2
 
+CUSTOMER_FILE = "GameData/customerlist.csv"
+
+SIM_STEP_MS = 16 # game time per simulation step, all the timers below are counted in these
+MAX_FRAME_MS = 250 # longest frame we'll try to catch up on, anything past this is dropped so a hitch can't snowball
+
 
 
 # Game-related fun stuff :)
 
+class EventQueue:
+    # Things waiting for their turn, kept in a heap by (due turn, order).
+    # Only what's due gets popped, so the work per turn depends on how many things wake up, not how many are waiting.
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, due:int, order:int, item):
+        # order breaks ties between things due on the same turn, lowest goes first. Keep it unique per item.
+        heapq.heappush(self.heap, (due, order, item))
+
+    def pop_due(self, now:int) -> list:
+        # Takes out everything due on or before this turn, in order.
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    def clear(self):
+        self.heap = []
+
+class SimClock:
+    # Fixed timestep scheduler. Frames feed it real time with advance(), it tells you how many fixed steps to run.
+    # The game logic only ever sees whole steps, so it runs the same no matter the frame rate.
+    def __init__(self, step_ms:int = SIM_STEP_MS, max_frame_ms:int = MAX_FRAME_MS, speed:float = 1):
+        self.step_ms = step_ms
+        self.max_frame_ms = max_frame_ms
+        self.speed = speed # game ms per real ms, turn it up to fast forward
+        self.accumulator = 0 # game time we owe but haven't stepped yet
+        self.steps = 0 # total steps run
+        self.dropped_ms = 0 # real time thrown away by the catch-up cap
+
+    def advance(self, delta) -> int:
+        # Adds a frame's worth of time, returns how many steps are due.
+        if delta > self.max_frame_ms:
+            self.dropped_ms += delta - self.max_frame_ms
+            delta = self.max_frame_ms
+        self.accumulator += delta * self.speed
+        due = int(self.accumulator // self.step_ms)
+        self.accumulator -= due * self.step_ms
+        self.steps += due
+        return due
+
+    @property
+    def alpha(self) -> float:
+        # How far we are between the last step and the next one (0-1), for smoothing things out when drawing.
+        return self.accumulator / self.step_ms
+
+    def set_speed(self, speed:float):
+        self.speed = max(0, speed)
+
+    def reset(self):
+        # Throws away any leftover time, so a new day starts on a step.
+        self.accumulator = 0
+
+
 class GameData:
-    def __init__(self, parent_state:StateManager, from_file = False):
+    def __init__(self, parent_state:StateManager|None, from_file:str|bool = False, seed:int|None = None, use_numpy:bool = False,
+                 customer_pool:CustomerPool|None = None):
         # Engine stuff:
+        # from_file can be a save file path (True = SAVE_FILE), see saves.py
+        # customer_pool is who can come in, see read_customer_list (the file isn't read for you, pass one in)
+        # With no parent state we run headless: no windows get made or updated, it's just the game logic. (see simulate.py)
         self.screen = parent_state
+        self.headless = parent_state == None
         self.signals = [] # a list of signals we've received from children    
+        self.autosaver = None # an Autosaver to hand a snapshot to at the end of every day, if we want autosaves
+        # All the game's random numbers come from here, same seed = same game (see rng.py)
+        self.rng = GameRandom(seed, use_numpy)
 
 
         # Economy
         self.money = 500.00
-        self.property = Property(parent_state)
+        self.property = Property(self, self.rng)
         self.customers = [] # customers currently in the arcade
-        self.historic_data = deque([], 30) # 30 days of economic data
+        self.customer_count = 0 # everyone who's ever come in, used to give customers their turn order
+        self.customer_pool = customer_pool if customer_pool != None else CustomerPool() # no pool, everyone's DEFAULT_PROFILE
+        self.history = DayHistory() # every finished day's numbers, see history.py
 
 
 
@@ -45,12 +123,18 @@ class GameData:
         self.day_timer = 0 # counter for day length
         self.movement_rate_ms = 800 # how many ms between customer steps. keeping it slow for now.
         self.move_timer = 0
+        self.turn = 0 # how many movement ticks have happened
+        self.turn_queue = EventQueue() # customers waiting for their next action, see move_customers()
+        self.clock = SimClock() # runs the day in fixed steps, see sim_step()
         
         
         if from_file:
-            print("dunno how to load yet.")
+            # load before making windows, so they start out showing the saved game
+            restore(read_snapshot(SAVE_FILE if from_file == True else from_file), self)
 
         # Set windows:
+        if self.headless:
+            return
         self.calendar = CalendarWindow(self, [0,1], self.month, self.day, self.year)
         self.status_window = StatusWindow(self)
         self.property_map = PropertyMap(self, self.property)
@@ -64,6 +148,24 @@ class GameData:
         self.screen.add_window(self.property_map)
         self.screen.add_window(self.feed_window)
 
+    def resume(self):
+        # Sets the windows up for wherever a loaded game was, without moving the day on like start_pre_day does.
+        self.calendar.set_date(self.month, self.day, self.year)
+        self.property_map.draw_map()
+        for cust in self.customers:
+            self.property_map.place_customer(cust)
+        if self.day_state == DAY_RUN:
+            self.status_window.start_day()
+        else:
+            self.status_window.start_pre_day()
+
+    def close(self):
+        # Gets rid of our windows, for when another game replaces us.
+        if self.headless:
+            return
+        for window in (self.calendar, self.status_window, self.property_map, self.feed_window):
+            window.queue_destroy()
+
     def increment_day(self, days = 1):
         self.day += days
         self.running_day_count += days
@@ -91,77 +193,109 @@ class GameData:
 
 
         self.increment_day()
+        if self.headless:
+            return
         self.calendar.set_date(self.month, self.day, self.year)
         self.property_map.draw_map()
         self.status_window.start_pre_day()
 
 
     def add_customer(self):
-        # TODO: this is where you generate them i guess
-        new_customer = Customer(self.property)
+        new_customer = Customer(self.property, self.rng, self.customer_pool.sample(self.rng))
+        new_customer.order = self.customer_count
+        self.customer_count += 1
         self.customers.append(new_customer)
         self.property.add_customer(new_customer)
+        self.turn_queue.schedule(self.turn + 1, new_customer.order, (self.turn, new_customer))
 
 
     def start_day(self):
-        # First clean up the last day's mess:
-        self.historic_data.appendleft(self.current_day)
+        # Fresh record for the day (the last one went into history when it ended):
         self.current_day = Date(self.running_day_count)
         # Then we start a fresh day!!!
         self.day_state = DAY_RUN
-        self.status_window.start_day()
+        self.day_timer = 0
+        self.move_timer = 0
+        self.clock.reset()
+        if not self.headless:
+            self.status_window.start_day()
 
         
     
         
 
     def tick_day_logic(self, delta):
-        self.day_timer += delta
-        self.move_timer += delta
+        # Called every frame. Runs however many fixed steps the clock says are due, then updates the windows once.
+        for i in range(self.clock.advance(delta)):
+            self.sim_step()
+            if self.day_state != DAY_RUN:
+                self.clock.reset()
+                break
+        if self.headless:
+            return
+        if self.day_state == DAY_RUN:
+            self.status_window.tick_day()
+        # Draw property window:
+        self.property_map.draw_map()
+
+    def sim_step(self):
+        # One fixed step of the day: maybe a new customer, customers act if it's their turn, and the day clock ticks.
+        step = self.clock.step_ms
+        self.day_timer += step
+        self.move_timer += step
         if len(self.customers) < self.property.capacity:
-            if self.property.popularity > random.randint(0,40):
+            if self.property.popularity > self.rng.randint(0,40):
                 self.add_customer()
-                self.feed_window.add_text_line(f"{self.customers[-1].name} came in!")
+                self.report(f"{self.customers[-1].name} came in!")
                 self.current_day.visitors += 1
-                
-                    
-                    
-        if self.move_timer > self.movement_rate_ms:
-            self.move_timer -= self.movement_rate_ms
-            for cust in self.customers:
-                cust.do_action()
-        if self.day_timer <= self.day_length:
-            self.status_window.tick_day()
-        else:
-            self.end_day()
-        
-        
-        
+
         # get the customers to do things and report them in our text window:
-        if self.move_timer > self.movement_rate_ms:
+        if self.move_timer >= self.movement_rate_ms:
             self.move_timer -= self.movement_rate_ms
-            for cust in self.customers:
-                if cust.destroy:
-                    self.customers.remove(cust)
-                    continue
-                action = cust.do_action()
-                if action == "PLAYSTART":
-                    self.feed_window.add_text_line(f"{cust.name} started playing {cust.target.name}!")
-                    self.money += cust.target.price
-                    self.current_day.add_transaction(cust.target, cust.target.price)
-                elif action == "LEFT":
-                    self.feed_window.add_text_line(f"{cust.name} left!")
+            self.move_customers()
 
+        if self.day_timer > self.day_length:
+            self.end_day()
 
+    def move_customers(self):
+        # Only customers whose turn has come up act, anyone in the middle of a game sleeps in the queue until it's over.
+        self.turn += 1
+        for due, order, (last_turn, cust) in self.turn_queue.pop_due(self.turn):
+            if cust.destroy:
+                self.customers.remove(cust)
+                self.property.remove_customer(cust)
+                if not self.headless:
+                    self.property_map.remove_customer(cust)
+                continue
+            action = cust.do_action(self.turn - last_turn)
+            if action == "PLAYSTART":
+                self.report(f"{cust.name} started playing {cust.target.name}!")
+                self.money += cust.target.price
+                self.current_day.add_transaction(cust.target, cust.target.price)
+            elif action == "LEFT":
+                self.report(f"{cust.name} left!")
+
+            if not self.headless:
                 self.property_map.place_customer(cust)
-        # Draw property window:
-        self.property_map.draw_map() 
+            self.turn_queue.schedule(self.turn + cust.next_turn(), order, (self.turn, cust))
 
+    def set_speed(self, speed:float):
+        # Game speed multiplier: 1 is normal, 4 runs four times as many sim steps per second, 0 pauses.
+        self.clock.set_speed(speed)
+
+    def report(self, text:str):
+        # Puts a line in the data feed, if we have one.
+        if not self.headless:
+            self.feed_window.add_text_line(text)
 
-        
     def end_day(self):
-        print("DAY OVER")
+        if not self.headless:
+            print("DAY OVER")
         self.day_state = DAY_END
+        self.history.record_day(self.current_day, self.property.cabinets)
+        if self.autosaver != None:
+            # only the snapshot happens here, the worker thread does the writing
+            self.autosaver.request(self)
 
         #TODO: spawn end of day windows, etc.
 
@@ -169,13 +303,20 @@ class GameState(StateManager):
     # Specifically for my arcadey game thing.
     def __init__(self, grid: GridManager) -> None:
         super().__init__(grid)
-        self.game_data = GameData(self)
-        self.cabinets = [] # big list of cabinets
-        self.customers = [] # big list of customers
+        self.game_data = GameData(self) # placeholder with the default customer pool, the real one loads with the cabinets
+        self.game_started = False # is game_data an actual game yet (new or loaded), or just the placeholder
+        self.autosaver = Autosaver() # saves at the end of every day, in the background
+        self.catalogue = Catalogue() # every cabinet there is, see GameData/catalogue.py
+        self.customer_pool = None # every kind of customer there is, loaded along with the cabinets
+        self.data_loaded = False # True once the load_cabinets job is done
         self.boot()
         
     # Redefined parent funcs:
 
+    def quit(self):
+        self.autosaver.stop() # let a save that's being written finish
+        super().quit()
+
     def unhandled_input(self, key):
         pass
                 
@@ -190,9 +331,8 @@ class GameState(StateManager):
         # Builds the menus and windows for initial boot:
         self.filemenu = Menu("FILE", 0)
         newgame = MenuItem(self.filemenu, "New...", 0, open_new_game_menu, [self])
-        loadgame = MenuItem(self.filemenu, "Load...", 0, print, ["ass"])
-        savegame = MenuItem(self.filemenu, "Save...", 0, print, ["save..."])
-        savegame.enabled = False
+        loadgame = MenuItem(self.filemenu, "Load...", 0, self.load_game, None)
+        savegame = MenuItem(self.filemenu, "Save...", 0, self.save_game, None)
         quit = MenuItem(self.filemenu, "Exit", 1, self.quit, None)
         
         self.filemenu.add_child(newgame)
@@ -221,6 +361,8 @@ class GameState(StateManager):
 
     def load_data(self):
         # Load the data for the game itself
+        # The actual loading is a job (see StateManager.add_job), so it happens a batch at a time in between frames
+        # and the progress bar moves as it goes.
         load_screen = Window(self, Rect(1,2,78, 27), "")
         load_bar = ProgressBar([10,10],50)
         load_label = Content([10,9], "Loading...")
@@ -229,33 +371,84 @@ class GameState(StateManager):
         load_screen.add_child(load_bar)
         load_screen.add_child(load_label)
         load_screen.add_child(load_type)
-        self.force_screen_refresh() # draw our window instantly.
-
-        # Todo: have a big list of customers
-        custlist = []
-        cablist = []
-        
-        with open("GameData/cabinetlist.csv", "r") as cabfile:
-            cabreader = csv.reader(cabfile, delimiter = ";")
-            for line in cabreader:
-                cablist.append(line)
-        total_items = len(custlist) + len(cablist)
-        load_bar.target_val = total_items + 10
-
+        self.add_job(self.load_cabinets(load_screen, load_bar, load_type))
+
+    def load_cabinets(self, load_screen:Window, load_bar:ProgressBar, load_type:Content):
+        # Generator: reads the customer list, then gets the cabinet catalogue ready. If the cache is stale it gets recompiled a batch at a time,
+        # with the bar showing how much of the list we've read. Otherwise it's just mapped, which is instant.
+        load_type.update(new_text = "Loading Customers...")
+        yield # let the loading screen draw before we start
+        self.customer_pool = CustomerPool(read_customer_list())
         load_type.update(new_text = "Loading Cabinets...")
-        load_bar.set_value(8)
-        self.force_screen_refresh()
-        for c in cablist:
-            load_bar.increment_value(1)
-            self.force_screen_refresh()
-            self.cabinets.append(Cabinet(c))
+        load_bar.set_value(0)
+        yield
+        if not self.catalogue.is_fresh():
+            load_type.update(new_text = "Compiling Cabinet List...")
+            for bytes_read, file_size in self.catalogue.compile_steps():
+                load_bar.target_val = file_size
+                load_bar.set_value(bytes_read)
+                yield
+        self.catalogue.open()
+        load_bar.set_value(load_bar.target_val)
+        self.data_loaded = True
         load_screen.queue_destroy()
 
     def start_new_game(self):
-        self.game_data = GameData(self)
-        self.game_data.property.add_cabinet(self.cabinets[0])
+        if not self.data_loaded:
+            print("Still loading!")
+            return
+        self.game_data.close()
+        self.game_data = GameData(self, customer_pool = self.customer_pool)
+        self.game_data.property.add_cabinet(self.catalogue.cabinet(0))
+        self.game_data.autosaver = self.autosaver
         self.game_data.boot()
         self.game_data.start_pre_day()
+        self.game_started = True
+
+    def save_game(self, path:str = SAVE_FILE):
+        if not self.game_started:
+            print("Nothing to save yet!")
+            return
+        try:
+            save_game(self.game_data, path)
+        except OSError as error:
+            self.game_data.report(f"Couldn't save: {error}")
+            return
+        self.game_data.report(f"Saved to {path}")
+
+    def load_game(self, path:str = SAVE_FILE):
+        if not os.path.exists(path):
+            print(f"No save file at {path}")
+            return
+        try:
+            loaded = GameData(self, from_file = path, customer_pool = self.customer_pool)
+        except (SaveError, OSError) as error:
+            print(f"Couldn't load {path}: {error}")
+            return
+        self.game_data.close()
+        self.game_data = loaded
+        self.game_data.autosaver = self.autosaver
+        self.game_data.boot()
+        self.game_data.resume()
+        self.game_started = True
+        self.game_data.report(f"Loaded {path}")
+
+
+def read_cabinet_list(path:str = CABINET_FILE) -> list:
+    # Reads the cabinet data file, returns a list of rows to make Cabinets out of.
+    cablist = []
+    with open(path, "r") as cabfile:
+        cabreader = csv.reader(cabfile, delimiter = ";")
+        for line in cabreader:
+            cablist.append(line)
+    return cablist
+
+
+def read_customer_list(path:str = CUSTOMER_FILE) -> list:
+    # Reads the customer data file, returns a list of rows to make CustomerProfiles out of.
+    # name;favourite genre;money;patience;map colour;weight
+    with open(path, "r") as custfile:
+        return [line for line in csv.reader(custfile, delimiter = ";") if line]
 
 
 def open_new_game_menu(state_target:GameState):
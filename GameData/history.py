@@ -0,0 +1,90 @@
+# Economic history, kept as columns.
+# Each column is a typed array with one entry per day, plus a running total so any "last N days" sum is two lookups.
+# Appending a day is O(1) and nothing ever gets thrown away, so we can show 7/30/365 day stats without walking objects.
+
+from array import array
+
+
+ROLLING_WINDOWS = (7, 30, 365) # day ranges for stats()
+
+
+class ColumnStore:
+    # A table of numbers, one row per day. columns is a dict of name -> array typecode ("q" for counts, "d" for money).
+    def __init__(self, columns:dict):
+        self.columns = {name:array(typecode) for name, typecode in columns.items()}
+        # totals[name][i] is the sum of the first i rows, so totals[name][0] is always 0
+        self.totals = {name:array("q" if typecode in "bBhHiIlLqQ" else "d", [0]) for name, typecode in columns.items()}
+
+    def __len__(self):
+        return len(self.totals[next(iter(self.totals))]) - 1
+
+    def append(self, **values):
+        # Adds a row. Leave a column out and it gets 0.
+        for name, column in self.columns.items():
+            value = values.get(name, 0)
+            column.append(value)
+            totals = self.totals[name]
+            totals.append(totals[-1] + value)
+
+    def total(self, name:str, days:int|None = None):
+        # Sum of the last days rows (all of them if days is None)
+        totals = self.totals[name]
+        if days == None or days >= len(totals) - 1:
+            return totals[-1]
+        return totals[-1] - totals[-1 - days]
+
+    def mean(self, name:str, days:int|None = None) -> float:
+        # Average over the last days rows, or however many we have if that's fewer
+        count = len(self) if days == None else min(days, len(self))
+        if count == 0:
+            return 0.0
+        return self.total(name, days) / count
+
+    def rolling_total(self, name:str, window:int) -> list:
+        # For every row, the sum of the window rows ending on it (fewer at the start)
+        totals = self.totals[name]
+        return [totals[i] - totals[max(0, i - window)] for i in range(1, len(totals))]
+
+    def rolling_mean(self, name:str, window:int) -> list:
+        return [total / min(window, i + 1) for i, total in enumerate(self.rolling_total(name, window))]
+
+    def last(self, name:str, days:int) -> array:
+        # The last days values of a column, as an array slice
+        return self.columns[name][-days:]
+
+
+class CabinetHistory(ColumnStore):
+    # One cabinet's plays and income. first_day is the history row it was first recorded on, rows line up with the days after that.
+    def __init__(self, first_day:int):
+        super().__init__({"plays":"q", "income":"d"})
+        self.first_day = first_day
+
+
+class DayHistory(ColumnStore):
+    # Every day of the game: visitors, income and expenses, plus plays/income for each cabinet we've had (by name).
+    def __init__(self):
+        super().__init__({"day":"q", "visitors":"q", "income":"d", "expenses":"d"})
+        self.cabinets = {} # cabinet name -> CabinetHistory
+
+    def record_day(self, date, cabinets:list = ()):
+        # Adds a finished day (a Date) and the day's numbers from each cabinet, then resets the cabinets for tomorrow.
+        row = len(self)
+        self.append(day = date.absolute_day, visitors = date.visitors, income = date.income, expenses = date.expenses)
+        cabinet_rows = {}
+        for cab in cabinets:
+            plays, income = cabinet_rows.get(cab.name, (0, 0.0))
+            cabinet_rows[cab.name] = (plays + cab.day_data["Plays"], income + cab.day_data["Income"])
+            cab.day_data["Day"] = date.absolute_day + 1
+            cab.day_data["Plays"] = 0
+            cab.day_data["Income"] = 0.00
+        for name in cabinet_rows:
+            if name not in self.cabinets:
+                self.cabinets[name] = CabinetHistory(row)
+        # cabinets we've had before but not today still get a row, so everyone stays lined up by day
+        for name, cab_history in self.cabinets.items():
+            plays, income = cabinet_rows.get(name, (0, 0.0))
+            cab_history.append(plays = plays, income = income)
+
+    def stats(self, name:str, windows = ROLLING_WINDOWS) -> dict:
+        # {window: (sum, mean)} for the last 7/30/365 days of a column
+        return {days:(self.total(name, days), self.mean(name, days)) for days in windows}
@@ -0,0 +1,67 @@
+# Memory benchmark.
+# Uses tracemalloc to measure how many bytes the objects we make lots of take up, each.
+# "before" is an unslotted copy of each class (same methods, no __slots__), so it shows what __slots__ saves on its own.
+# It doesn't include the other things that shrank along with it, like customers not carrying a map icon any more.
+# Usage (from the top folder): python -m GameData.membench
+
+import tracemalloc
+from engine import TileGrid, GridTile
+from ui import Content
+from GameData.actors import Cabinet, Customer, Date, Property
+from GameData.game import read_cabinet_list
+
+
+def bytes_each(make, count:int = 1000) -> float:
+    # Average bytes held per object, for count objects made by make(i). Keeps them all alive until it's measured.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def unslotted(cls:type) -> type:
+    # A copy of cls without __slots__: same methods and properties, but every instance gets a __dict__.
+    slots = cls.__dict__.get("__slots__", ())
+    members = {name:value for name, value in cls.__dict__.items() if name not in slots and name not in ("__slots__", "__dict__", "__weakref__")}
+    return type(cls.__name__, cls.__bases__, members)
+
+
+def memory_report(count:int = 1000) -> dict:
+    # {name: (bytes before, bytes after)} per object for the hot classes. Lists of them hold a pointer each, that's in the numbers too.
+    grid = TileGrid(80, 30)
+    cablist = read_cabinet_list()
+    test_property = Property(None)
+    cabinet = Cabinet(cablist[0])
+
+    def report(cls:type, make) -> tuple:
+        # make(cls, i) builds one object with the given class
+        before_class = unslotted(cls)
+        return (bytes_each(lambda i: make(before_class, i), count), bytes_each(lambda i: make(cls, i), count))
+
+    def make_date(date_class, i):
+        day = date_class(i)
+        day.add_transaction(cabinet, 0.25) # every real day has some income
+        return day
+
+    tile_storage = bytes_each(lambda i: TileGrid(80, 30), 20) / (80 * 30) # no objects here to slot, it's the same both ways
+    return {
+        "tile (grid storage)":(tile_storage, tile_storage),
+        "tile (GridTile view)":report(GridTile, lambda tile_class, i: tile_class(grid, i % 80, (i // 80) % 30)),
+        "content":report(Content, lambda content_class, i: content_class([0, 0], "CONTENT")),
+        "customer":report(Customer, lambda customer_class, i: customer_class(test_property)),
+        "cabinet":report(Cabinet, lambda cabinet_class, i: cabinet_class(cablist[i % len(cablist)])),
+        "day record":report(Date, make_date)
+    }
+
+
+def main():
+    print(f"{'':<22}{'BEFORE':>8}{'AFTER':>8}  (bytes each, before = no __slots__)")
+    for name, (before, after) in memory_report().items():
+        print(f"{name:<22}{before:>8.0f}{after:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Rendering benchmark.
+# Times GridManager.update_screen redrawing the whole screen in both render modes: "tiles" (one glyph per tile)
+# and "runs" (stretches of same-coloured tiles as one string), with the glyph caches warm and cold.
+# Also times StateManager.tick with a pile of overlapping windows open, and draw_square against the old
+# check-every-tile version of it.
+# Usage (from the top folder): python -m GameData.renderbench
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # no window needed, we only draw onto surfaces
+import time
+import pygame
+from pygame import Rect
+from engine import GridManager, StateManager, COLOUR_INDEX
+from ui import Window, Content, Button
+
+
+def boot_screen(grid:GridManager) -> StateManager:
+    # Something like what the game shows at boot: menu bar, infobar and the welcome window.
+    state = StateManager(grid)
+    hellowindow = Window(state, Rect(5,5,40, 10), "")
+    hellowindow.add_child(Content([5,2], "WELCOME TO THE GAME"))
+    hellowindow.add_child(Button([10,4], "START NEW GAME", "GREEN", "GREY"))
+    state.add_window(hellowindow)
+    state.tick(0)
+    return state
+
+
+def busy_screen(grid:GridManager, frame:int = 0) -> StateManager:
+    # Lots of different text on screen. frame changes every line, so each frame brings new runs to render.
+    state = StateManager(grid)
+    window = Window(state, Rect(0,1,grid.columns, grid.rows - 2), "")
+    for line in range(grid.rows - 4):
+        window.add_child(Content([1, line], f"Customer {frame * 100 + line} played cabinet #{line * 7 + frame}!"))
+    state.add_window(window)
+    state.tick(0)
+    return state
+
+
+def window_pile(grid:GridManager, count:int) -> StateManager:
+    # count overlapping 30x12 windows, each with a block of text and a button, stepped across the screen.
+    state = StateManager(grid)
+    for i in range(count):
+        window = Window(state, Rect((i * 4) % (grid.columns - 30), 1 + (i * 2) % (grid.rows - 14), 30, 12), f"WINDOW {i}")
+        window.add_child(Content([1,1], f"Window number {i}\nhas a few lines\nof text in it."))
+        window.add_child(Button([1,6], "PRESS ME", "GREEN", "GREY"))
+        state.add_window(window)
+    return state
+
+
+def time_ticks(state:StateManager, frames:int = 200) -> float:
+    # ms per StateManager.tick (game logic, window drawing, menus and infobar onto the grid)
+    state.tick(16)
+    start = time.perf_counter()
+    for i in range(frames):
+        state.tick(16)
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def draw_square_per_tile(grid:GridManager, area:Rect, char:str = " ", fg:str = "WHITE", bg:str = "BLUE"):
+    # What draw_square used to do: look at every tile in the grid and fill the ones inside area.
+    char_code = ord(char[0])
+    control = grid.add_control(None, None)
+    for row in range(grid.rows):
+        for col in range(grid.columns):
+            if area.collidepoint(col, row):
+                i = row * grid.columns + col
+                grid.tile_chars[i] = char_code
+                grid.tile_fg[i] = COLOUR_INDEX[fg]
+                grid.tile_bg[i] = COLOUR_INDEX[bg]
+                grid.tile_controls[i] = control
+
+
+def time_squares(grid:GridManager, draw, count:int, repeats:int = 50) -> float:
+    # ms to fill count 30x12 squares, the size of the windows in window_pile
+    areas = [Rect((i * 4) % (grid.columns - 30), 1 + (i * 2) % (grid.rows - 14), 30, 12) for i in range(count)]
+    start = time.perf_counter()
+    for i in range(repeats):
+        for area in areas:
+            draw(area)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def window_report(counts = (1, 10, 12, 40), columns:int = 80, rows:int = 30) -> dict:
+    # {window count: (ms per tick, ms for draw_square, ms for the per-tile version)}
+    grid = GridManager(columns, rows)
+    results = {}
+    for count in counts:
+        results[count] = (time_ticks(window_pile(grid, count)),
+                          time_squares(grid, lambda area: grid.draw_square(area, " ", "WHITE", "BLUE"), count),
+                          time_squares(grid, lambda area: draw_square_per_tile(grid, area), count))
+    return results
+
+
+def time_redraw(grid:GridManager, state:StateManager, mode:str, cold:bool, repeats:int = 50) -> float:
+    # ms per full-screen update_screen
+    grid.render_mode = mode
+    grid.update_screen(state) # warm up
+    total = 0.0
+    for i in range(repeats):
+        if cold:
+            grid.glyph_cache.clear()
+            grid.run_cache.clear()
+        grid.redraw_all()
+        start = time.perf_counter()
+        grid.update_screen(state)
+        total += time.perf_counter() - start
+    return total / repeats * 1000
+
+
+def churn(grid:GridManager, frames:int = 200) -> dict:
+    # Hit rates when every frame shows new text, so the run cache keeps filling up. Single glyphs should still hit.
+    grid.render_mode = "runs"
+    grid.glyph_cache.clear()
+    grid.run_cache.clear()
+    start = time.perf_counter()
+    for frame in range(frames):
+        grid.redraw_all()
+        grid.update_screen(busy_screen(grid, frame))
+    elapsed = time.perf_counter() - start
+    return {
+        "ms per frame":elapsed / frames * 1000,
+        "glyph hit rate":grid.glyph_cache.hits / max(1, grid.glyph_cache.hits + grid.glyph_cache.misses),
+        "run hit rate":grid.run_cache.hits / max(1, grid.run_cache.hits + grid.run_cache.misses)
+    }
+
+
+def text_report(columns:int = 80, rows:int = 30) -> dict:
+    # {(screen, mode, warm/cold): ms per full redraw}
+    grid = GridManager(columns, rows)
+    results = {}
+    for screen_name, make_screen in (("boot", boot_screen), ("busy", busy_screen)):
+        state = make_screen(grid)
+        for mode in ("tiles", "runs"):
+            for cold in (False, True):
+                results[(screen_name, mode, "cold" if cold else "warm")] = time_redraw(grid, state, mode, cold)
+    return results
+
+
+def main():
+    pygame.init()
+    print("Full screen redraw, 80x30:")
+    for (screen_name, mode, cache), ms in text_report().items():
+        print(f"  {screen_name:<6}{mode:<7}{cache:<6}{ms:>8.2f} ms")
+    print("Runs mode, new text every frame (200 frames):")
+    for name, value in churn(GridManager(80, 30)).items():
+        print(f"  {name:<16}{value:>8.2f}")
+    print("Overlapping 30x12 windows, 80x30:")
+    print("  WINDOWS    TICK  DRAW_SQUARE  PER-TILE")
+    for count, (tick_ms, square_ms, per_tile_ms) in window_report().items():
+        print(f"  {count:>7}{tick_ms:>8.2f}{square_ms:>13.3f}{per_tile_ms:>10.2f}  ms")
+
+
+if __name__ == "__main__":
+    main()
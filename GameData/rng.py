@@ -0,0 +1,76 @@
+# Random numbers for the simulation.
+# Every GameData gets its own GameRandom and hands it to its Property and Customers, so nothing touches the
+# random module's global state: same seed = same days, and games in different processes can't affect each other.
+
+import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+BATCH_SIZE = 4096 # how many floats we draw at once
+
+
+class GameRandom:
+    # Draws floats in batches and turns them into whatever we need, which is a lot cheaper per call than random.randint.
+    # use_numpy draws the batches with a NumPy Generator instead of random.Random (falls back if NumPy isn't there).
+    def __init__(self, seed:int|None = None, use_numpy:bool = False, batch_size:int = BATCH_SIZE):
+        self.seed = seed
+        self.use_numpy = use_numpy and np != None
+        self.batch_size = batch_size
+        if self.use_numpy:
+            self.generator = np.random.default_rng(seed)
+        else:
+            self.generator = random.Random(seed)
+        self.batch = []
+        self.position = 0 # next unused float in batch
+
+    def refill(self):
+        if self.use_numpy:
+            self.batch = self.generator.random(self.batch_size).tolist()
+        else:
+            draw = self.generator.random
+            self.batch = [draw() for i in range(self.batch_size)]
+        self.position = 0
+
+    def random(self) -> float:
+        # Float in [0, 1)
+        if self.position >= len(self.batch):
+            self.refill()
+        value = self.batch[self.position]
+        self.position += 1
+        return value
+
+    def randint(self, low:int, high:int) -> int:
+        # Whole number from low to high, including both ends (same as random.randint)
+        return low + int(self.random() * (high - low + 1))
+
+    def chance(self, odds:float) -> bool:
+        # True odds of the time, 0-1
+        return self.random() < odds
+
+    def choice(self, options:list):
+        return options[int(self.random() * len(options))]
+
+    def getstate(self) -> tuple:
+        # Everything needed to carry on exactly where we left off, for saving.
+        if self.use_numpy:
+            generator_state = self.generator.bit_generator.state
+        else:
+            generator_state = self.generator.getstate()
+        return (self.use_numpy, generator_state, list(self.batch[self.position:]))
+
+    def setstate(self, state:tuple):
+        use_numpy, generator_state, leftover = state
+        if use_numpy and np == None:
+            raise ImportError("this random state was made with NumPy, which isn't installed")
+        self.use_numpy = use_numpy
+        if use_numpy:
+            self.generator = np.random.default_rng()
+            self.generator.bit_generator.state = generator_state
+        else:
+            self.generator = random.Random()
+            self.generator.setstate(generator_state)
+        self.batch = list(leftover)
+        self.position = 0
@@ -0,0 +1,554 @@
+# Save games.
+# capture() copies everything about a GameData into a snapshot (plain tuples/bytes, nothing shared with the live game),
+# encode() turns a snapshot into bytes a chunk at a time, and decode()/restore() go the other way.
+#
+# File layout: MAGIC, then a little-endian uint16 format version, then chunks until an "END " chunk.
+# Each chunk is a 4 byte tag, a uint32 length and that many bytes. Readers skip tags they don't know,
+# so new chunks can be added without breaking old saves. Change SAVE_VERSION if an existing chunk changes.
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from GameData.actors import MONTHS, Cabinet, Customer, Date
+from GameData.rng import GameRandom
+from GameData.history import ColumnStore, CabinetHistory
+
+
+MAGIC = b"ARCADESV"
+SAVE_VERSION = 1
+SAVE_FILE = "savegame.sav"
+AUTOSAVE_FILE = "autosave.sav"
+
+STATES = ["ENTER", "WANDER", "MOVE", "PLAY", "WAIT", "LEAVE"] # Customer.state, stored as its index
+
+
+class SaveError(Exception):
+    pass
+
+
+# What a damaged chunk can throw while we pick it apart, all of which get turned into a SaveError:
+CORRUPT_ERRORS = (struct.error, UnicodeDecodeError, ValueError, TypeError, IndexError, KeyError, OverflowError)
+
+
+# Packing helpers:
+
+class Packer:
+    # Builds up one chunk's bytes.
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt:str, *values):
+        self.parts.append(struct.pack("<" + fmt, *values))
+
+    def string(self, text:str):
+        data = text.encode("utf-8")
+        self.pack("I", len(data))
+        self.parts.append(data)
+
+    def numbers(self, values:array):
+        # typecode, count, then the values, little-endian
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.parts.append(values.typecode.encode("ascii"))
+        self.pack("I", len(values))
+        self.parts.append(values.tobytes())
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class Unpacker:
+    def __init__(self, data:bytes):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def unpack(self, fmt:str):
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.data, self.position)
+        self.position += struct.calcsize(fmt)
+        return values if len(values) > 1 else values[0]
+
+    def take(self, length:int) -> memoryview:
+        # The next length bytes, or a SaveError if the chunk runs out first.
+        if self.position + length > len(self.data):
+            raise SaveError("a chunk in the save file is cut short")
+        data = self.data[self.position:self.position + length]
+        self.position += length
+        return data
+
+    def string(self) -> str:
+        length = self.unpack("I")
+        return bytes(self.take(length)).decode("utf-8")
+
+    def numbers(self) -> array:
+        typecode = chr(self.take(1)[0])
+        count = self.unpack("I")
+        values = array(typecode)
+        values.frombytes(self.take(values.itemsize * count))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+
+# Taking a snapshot:
+
+def capture(game_data) -> dict:
+    # Copies out everything we need to carry on from this exact point. Cheap enough to do between frames.
+    clock = game_data.clock
+    current = game_data.current_day
+    game_property = game_data.property
+    cabinet_numbers = {cab:i for i, cab in enumerate(game_property.cabinets)}
+    due_turns = {}
+    for due, order, (last_turn, cust) in game_data.turn_queue.heap:
+        due_turns[cust] = (due, last_turn)
+    return {
+        "game":(game_data.money, game_data.day, game_data.month, game_data.year, game_data.running_day_count,
+                game_data.day_state, game_data.day_length, game_data.day_timer, game_data.movement_rate_ms,
+                game_data.move_timer, game_data.turn, game_data.customer_count,
+                clock.step_ms, clock.accumulator, clock.speed),
+        "date":(current.absolute_day, current.income, current.expenses, current.visitors,
+                tuple(current.income_per_cabinet.items())),
+        "rng":game_data.rng.getstate(),
+        "property":(game_property.name, tuple(game_property.size), game_property.cab_max,
+                    tuple(tuple(spot) for spot in game_property.cab_positions), tuple(game_property.exit.location),
+                    game_property.capacity, game_property.popularity),
+        "cabinets":tuple(
+            (cab.name, cab.description, cab.release, cab.genre, cab.players, cab.price, cab.playtime, cab.owned,
+             tuple(cab.location), tuple(tuple(spot) for spot in cab.play_locations), cab.next_play_pos,
+             cab.current_players, cab.busy, cab.day_data["Day"], cab.day_data["Plays"], cab.day_data["Income"])
+            for cab in game_property.cabinets),
+        "history":capture_columns(game_data.history),
+        "cabinet_history":tuple((name, cab_history.first_day, capture_columns(cab_history))
+                                for name, cab_history in game_data.history.cabinets.items()),
+        "customers":tuple(
+            (cust.name, cust.preference, cust.money, cust.patience, tuple(cust.location), cust.play_timer,
+             STATES.index(cust.state), cabinet_numbers.get(cust.target, -1), tuple(cust.target_loc), cust.act_timer,
+             cust.order, cust.destroy) + due_turns.get(cust, (game_data.turn + 1, game_data.turn))
+            for cust in game_data.customers)
+    }
+
+
+def capture_columns(store:ColumnStore) -> tuple:
+    # (name, column, totals) for each column, copied so the game can keep appending while this gets written.
+    return tuple((name, array(column.typecode, column), array(store.totals[name].typecode, store.totals[name]))
+                 for name, column in store.columns.items())
+
+
+# Snapshot -> bytes:
+
+def encode(snapshot:dict):
+    # Yields the file a piece at a time, so a writer can stream it out (or spread it over a few frames).
+    yield MAGIC + struct.pack("<H", SAVE_VERSION)
+
+    game = Packer()
+    (money, day, month, year, running_day_count, day_state, day_length, day_timer, movement_rate_ms, move_timer,
+     turn, customer_count, step_ms, accumulator, speed) = snapshot["game"]
+    game.pack("dii", money, day, year)
+    game.string(month)
+    game.pack("qBqqqqqqqdd", running_day_count, day_state, day_length, day_timer, movement_rate_ms, move_timer,
+              turn, customer_count, step_ms, accumulator, speed)
+    yield chunk(b"GAME", game)
+
+    date = Packer()
+    absolute_day, income, expenses, visitors, per_cabinet = snapshot["date"]
+    date.pack("qddqI", absolute_day, income, expenses, visitors, len(per_cabinet))
+    for name, amount in per_cabinet:
+        date.string(name)
+        date.pack("d", amount)
+    yield chunk(b"DATE", date)
+
+    yield chunk(b"RAND", pack_rng(snapshot["rng"]))
+
+    prop = Packer()
+    name, size, cab_max, cab_positions, exit_location, capacity, popularity = snapshot["property"]
+    prop.string(name)
+    prop.pack("iiiiiddI", size[0], size[1], cab_max, exit_location[0], exit_location[1], capacity, popularity, len(cab_positions))
+    for spot in cab_positions:
+        prop.pack("ii", *spot)
+    yield chunk(b"PROP", prop)
+
+    cabs = Packer()
+    cabs.pack("I", len(snapshot["cabinets"]))
+    for (name, description, release, genre, players, price, playtime, owned, location, play_locations, next_play_pos,
+         current_players, busy, data_day, data_plays, data_income) in snapshot["cabinets"]:
+        cabs.string(name)
+        cabs.string(description)
+        cabs.string(genre)
+        cabs.pack("iidi??iiiI", release, players, price, playtime, owned, busy, next_play_pos, current_players,
+                  data_day, data_plays)
+        cabs.pack("diiI", data_income, location[0], location[1], len(play_locations))
+        for spot in play_locations:
+            cabs.pack("ii", *spot)
+    yield chunk(b"CABS", cabs)
+
+    history = Packer()
+    pack_columns(history, snapshot["history"])
+    history.pack("I", len(snapshot["cabinet_history"]))
+    for name, first_day, columns in snapshot["cabinet_history"]:
+        history.string(name)
+        history.pack("q", first_day)
+        pack_columns(history, columns)
+    yield chunk(b"HIST", history)
+
+    custs = Packer()
+    custs.pack("I", len(snapshot["customers"]))
+    for (name, preference, money, patience, location, play_timer, state, target, target_loc, act_timer, order, destroy,
+         due, last_turn) in snapshot["customers"]:
+        custs.string(name)
+        custs.string(preference)
+        custs.pack("ddiiiBiiiiq?qq", money, patience, location[0], location[1], play_timer, state, target,
+                   target_loc[0], target_loc[1], act_timer, order, destroy, due, last_turn)
+    yield chunk(b"CUST", custs)
+
+    yield b"END " + struct.pack("<I", 0)
+
+
+def chunk(tag:bytes, packer:Packer) -> bytes:
+    data = packer.to_bytes()
+    return tag + struct.pack("<I", len(data)) + data
+
+
+def pack_columns(packer:Packer, columns:tuple):
+    packer.pack("I", len(columns))
+    for name, column, totals in columns:
+        packer.string(name)
+        packer.numbers(column)
+        packer.numbers(totals)
+
+
+def pack_rng(state:tuple) -> Packer:
+    # GameRandom.getstate(): (use_numpy, generator state, leftover floats)
+    use_numpy, generator_state, leftover = state
+    packer = Packer()
+    packer.pack("?", use_numpy)
+    if use_numpy:
+        packer.string(json.dumps(generator_state)) # NumPy's state is a dict of big ints, JSON copes with those
+    else:
+        version, internal, gauss = generator_state
+        packer.pack("i?d", version, gauss != None, gauss or 0.0)
+        packer.numbers(array("I", internal))
+    packer.numbers(array("d", leftover))
+    return packer
+
+
+# Bytes -> snapshot:
+
+def decode(file) -> dict:
+    # Reads a save from an open binary file, back into a snapshot.
+    header = file.read(len(MAGIC) + 2)
+    if len(header) < len(MAGIC) + 2 or header[0:len(MAGIC)] != MAGIC:
+        raise SaveError("not a save file")
+    version = struct.unpack("<H", header[len(MAGIC):])[0]
+    if version > SAVE_VERSION:
+        raise SaveError(f"save is from a newer version ({version}), we only know up to {SAVE_VERSION}")
+    chunks = {}
+    while True:
+        chunk_header = file.read(8)
+        if len(chunk_header) < 8:
+            raise SaveError("save file is cut short")
+        tag = chunk_header[0:4]
+        length = struct.unpack("<I", chunk_header[4:])[0]
+        if tag == b"END ":
+            break
+        data = file.read(length)
+        if len(data) < length:
+            raise SaveError("save file is cut short")
+        chunks[tag] = Unpacker(data)
+    for tag in (b"GAME", b"DATE", b"RAND", b"PROP", b"CABS", b"HIST", b"CUST"):
+        if tag not in chunks:
+            raise SaveError(f"save file is missing its {tag.decode()} chunk")
+    try:
+        return decode_chunks(chunks)
+    except CORRUPT_ERRORS as error:
+        raise SaveError(f"save file is corrupt ({type(error).__name__}: {error})") from error
+
+
+def decode_chunks(chunks:dict) -> dict:
+    # Turns the chunks decode() found back into a snapshot. The framing's fine by now, but what's inside might not be.
+    snapshot = {}
+    game = chunks[b"GAME"]
+    money, day, year = game.unpack("dii")
+    month = game.string()
+    rest = game.unpack("qBqqqqqqqdd")
+    snapshot["game"] = (money, day, month, year) + rest
+
+    date = chunks[b"DATE"]
+    absolute_day, income, expenses, visitors, count = date.unpack("qddqI")
+    per_cabinet = tuple((date.string(), date.unpack("d")) for i in range(count))
+    snapshot["date"] = (absolute_day, income, expenses, visitors, per_cabinet)
+
+    snapshot["rng"] = unpack_rng(chunks[b"RAND"])
+
+    prop = chunks[b"PROP"]
+    name = prop.string()
+    width, height, cab_max, exit_x, exit_y, capacity, popularity, count = prop.unpack("iiiiiddI")
+    cab_positions = tuple(prop.unpack("ii") for i in range(count))
+    snapshot["property"] = (name, (width, height), cab_max, cab_positions, (exit_x, exit_y), whole(capacity), whole(popularity))
+
+    cabs = chunks[b"CABS"]
+    cabinets = []
+    for i in range(cabs.unpack("I")):
+        name = cabs.string()
+        description = cabs.string()
+        genre = cabs.string()
+        release, players, price, playtime, owned, busy, next_play_pos, current_players, data_day, data_plays = cabs.unpack("iidi??iiiI")
+        data_income, x, y, count = cabs.unpack("diiI")
+        play_locations = tuple(cabs.unpack("ii") for j in range(count))
+        cabinets.append((name, description, release, genre, players, price, playtime, owned, (x, y), play_locations,
+                         next_play_pos, current_players, busy, data_day, data_plays, data_income))
+    snapshot["cabinets"] = tuple(cabinets)
+
+    history = chunks[b"HIST"]
+    snapshot["history"] = unpack_columns(history)
+    cabinet_history = []
+    for i in range(history.unpack("I")):
+        name = history.string()
+        first_day = history.unpack("q")
+        cabinet_history.append((name, first_day, unpack_columns(history)))
+    snapshot["cabinet_history"] = tuple(cabinet_history)
+
+    custs = chunks[b"CUST"]
+    customers = []
+    for i in range(custs.unpack("I")):
+        name = custs.string()
+        preference = custs.string()
+        (money, patience, x, y, play_timer, state, target, target_x, target_y, act_timer, order, destroy,
+         due, last_turn) = custs.unpack("ddiiiBiiiiq?qq")
+        customers.append((name, preference, money, whole(patience), (x, y), play_timer, state, target, (target_x, target_y),
+                          act_timer, order, destroy, due, last_turn))
+    snapshot["customers"] = tuple(customers)
+    return snapshot
+
+
+def unpack_columns(unpacker:Unpacker) -> tuple:
+    return tuple((unpacker.string(), unpacker.numbers(), unpacker.numbers()) for i in range(unpacker.unpack("I")))
+
+
+def unpack_rng(unpacker:Unpacker) -> tuple:
+    use_numpy = unpacker.unpack("?")
+    if use_numpy:
+        generator_state = json.loads(unpacker.string())
+    else:
+        version, has_gauss, gauss = unpacker.unpack("i?d")
+        generator_state = (version, tuple(unpacker.numbers()), gauss if has_gauss else None)
+    return (use_numpy, generator_state, list(unpacker.numbers()))
+
+
+def whole(number:float):
+    # capacity/popularity/patience are stored as doubles so fractional values survive, but stay ints if they were
+    return int(number) if number == int(number) else number
+
+
+# Snapshot -> game:
+
+def check(snapshot:dict, game_data):
+    # Makes sure a snapshot will load into game_data without tripping over anything, before restore() touches it.
+    # Raises a SaveError saying what's wrong.
+    game = snapshot["game"]
+    if game[2] not in MONTHS:
+        raise SaveError(f"save has an unknown month {game[2]!r}")
+    if game[5] not in (0, 1, 2): # DAY_START/DAY_RUN/DAY_END
+        raise SaveError(f"save has an unknown day state {game[5]}")
+    if game[12] <= 0: # the clock's step_ms, we divide by it
+        raise SaveError(f"save has a bad sim step of {game[12]}ms")
+
+    try:
+        GameRandom().setstate(snapshot["rng"]) # on a spare, so the live one is only set once we know it'll work
+    except ImportError as error:
+        raise SaveError(str(error)) from error
+    except CORRUPT_ERRORS as error:
+        raise SaveError(f"save has a bad random state ({error})") from error
+
+    for store, columns in [(game_data.history, snapshot["history"])] + [
+            (CabinetHistory(0), columns) for name, first_day, columns in snapshot["cabinet_history"]]:
+        for name, column, totals in columns:
+            if name not in store.columns:
+                raise SaveError(f"save has a history column we don't know ({name!r})")
+            if column.typecode != store.columns[name].typecode or totals.typecode != store.totals[name].typecode:
+                raise SaveError(f"save's {name!r} history column is the wrong type")
+            if len(totals) != len(column) + 1:
+                raise SaveError(f"save's {name!r} history column doesn't match its totals")
+
+    cabinets = snapshot["cabinets"]
+    for cust in snapshot["customers"]:
+        state, target = cust[6], cust[7]
+        if not 0 <= state < len(STATES):
+            raise SaveError(f"save has a customer in an unknown state ({state})")
+        if not -1 <= target < len(cabinets):
+            raise SaveError(f"save has a customer heading for a cabinet that isn't there ({target})")
+
+
+def restore(snapshot:dict, game_data):
+    # Loads a snapshot into a freshly made GameData (before it's made any windows).
+    # Everything gets checked first, so a bad save raises a SaveError and leaves game_data as it was.
+    check(snapshot, game_data)
+    try:
+        restore_checked(snapshot, game_data)
+    except CORRUPT_ERRORS as error:
+        # check() should've caught it, but a half-loaded game is still better thrown away than played
+        raise SaveError(f"save couldn't be loaded ({type(error).__name__}: {error})") from error
+
+
+def restore_checked(snapshot:dict, game_data):
+    (game_data.money, game_data.day, game_data.month, game_data.year, game_data.running_day_count,
+     game_data.day_state, game_data.day_length, game_data.day_timer, game_data.movement_rate_ms, game_data.move_timer,
+     game_data.turn, game_data.customer_count, step_ms, accumulator, speed) = snapshot["game"]
+    game_data.clock.step_ms = step_ms
+    game_data.clock.accumulator = accumulator
+    game_data.clock.speed = speed
+
+    absolute_day, income, expenses, visitors, per_cabinet = snapshot["date"]
+    game_data.current_day = Date(absolute_day)
+    game_data.current_day.income = income
+    game_data.current_day.expenses = expenses
+    game_data.current_day.visitors = visitors
+    game_data.current_day.income_per_cabinet = dict(per_cabinet)
+
+    game_data.rng.setstate(snapshot["rng"])
+
+    game_property = game_data.property
+    (game_property.name, size, game_property.cab_max, cab_positions, exit_location,
+     game_property.capacity, game_property.popularity) = snapshot["property"]
+    game_property.size = list(size)
+    game_property.cab_positions = [list(spot) for spot in cab_positions]
+    game_property.exit.location = list(exit_location)
+
+    for (name, description, release, genre, players, price, playtime, owned, location, play_locations, next_play_pos,
+         current_players, busy, data_day, data_plays, data_income) in snapshot["cabinets"]:
+        cab = Cabinet([name, description, str(release), genre, str(players)])
+        cab.price = price
+        cab.playtime = playtime
+        cab.owned = owned
+        cab.day_data = {"Day":data_day, "Plays":data_plays, "Income":data_income}
+        cab.next_play_pos = next_play_pos
+        cab.current_players = current_players
+        cab.busy = busy
+        game_property.restore_cabinet(cab, location, play_locations)
+
+    restore_columns(game_data.history, snapshot["history"])
+    for name, first_day, columns in snapshot["cabinet_history"]:
+        cab_history = CabinetHistory(first_day)
+        restore_columns(cab_history, columns)
+        game_data.history.cabinets[name] = cab_history
+
+    game_data.customers = []
+    game_data.turn_queue.clear()
+    for (name, preference, money, patience, location, play_timer, state, target, target_loc, act_timer, order, destroy,
+         due, last_turn) in snapshot["customers"]:
+        cust = Customer(game_property, game_data.rng, game_data.customer_pool.find(name, preference))
+        cust.money = money
+        cust.patience = patience
+        cust.play_timer = play_timer
+        cust.state = STATES[state]
+        cust.target = game_property.cabinets[target] if target >= 0 else None
+        cust.target_loc = list(target_loc)
+        cust.act_timer = act_timer
+        cust.order = order
+        cust.destroy = destroy
+        game_property.add_customer(cust)
+        game_property.move_customer(cust, location)
+        game_data.customers.append(cust)
+        game_data.turn_queue.schedule(due, order, (last_turn, cust))
+
+
+def restore_columns(store:ColumnStore, columns:tuple):
+    for name, column, totals in columns:
+        store.columns[name] = array(store.columns[name].typecode, column)
+        store.totals[name] = array(store.totals[name].typecode, totals)
+
+
+# Files:
+
+def write_snapshot(snapshot:dict, path:str, pause:float|None = None):
+    # Streams the snapshot out to a temp file and swaps it in, so a crash mid-save can't eat the old save.
+    # pause sleeps between chunks (0 is fine), so a background writer lets go of the GIL and doesn't hold up frames.
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as save_file:
+        for piece in encode(snapshot):
+            save_file.write(piece)
+            if pause != None:
+                time.sleep(pause)
+        save_file.flush()
+        os.fsync(save_file.fileno())
+    os.replace(temp_path, path)
+
+
+def save_game(game_data, path:str = SAVE_FILE):
+    write_snapshot(capture(game_data), path)
+
+
+def read_snapshot(path:str = SAVE_FILE) -> dict:
+    with open(path, "rb") as save_file:
+        return decode(save_file)
+
+
+class Autosaver:
+    # Saves in the background. request() takes the snapshot on the game's thread (well under a millisecond),
+    # and a worker thread does the encoding and writing, so the frame that asks for a save doesn't wait on the disk.
+    # Backpressure: there's only ever one save waiting. If a new one comes in while the last is still being written,
+    # the waiting one gets replaced (it's older anyway) and counted in skipped.
+    def __init__(self, path:str = AUTOSAVE_FILE):
+        self.path = path
+        self.waiting = None # snapshot for the worker to write next
+        self.busy = False # is the worker writing right now
+        self.running = True
+        self.condition = threading.Condition()
+        # instrumentation:
+        self.request_ms = 0.0 # time the last request() took on the calling thread
+        self.write_ms = 0.0 # time the last encode+write took on the worker
+        self.saves = 0
+        self.skipped = 0
+        self.error = None # the last thing that went wrong writing, if anything
+        self.thread = threading.Thread(target = self.work, name = "autosave", daemon = True)
+        self.thread.start()
+
+    def request(self, game_data) -> float:
+        # Snapshots the game and queues it for writing. Returns how many ms it cost the caller.
+        start = time.perf_counter()
+        snapshot = capture(game_data)
+        with self.condition:
+            if self.waiting != None:
+                self.skipped += 1
+            self.waiting = snapshot
+            self.condition.notify()
+        self.request_ms = (time.perf_counter() - start) * 1000
+        return self.request_ms
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.waiting == None and self.running:
+                    self.condition.wait()
+                if self.waiting == None:
+                    return # stopped, and nothing left to write
+                snapshot = self.waiting
+                self.waiting = None
+                self.busy = True
+            start = time.perf_counter()
+            try:
+                write_snapshot(snapshot, self.path, pause = 0)
+                self.saves += 1
+                self.error = None
+            except OSError as error:
+                self.error = error
+            self.write_ms = (time.perf_counter() - start) * 1000
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def wait(self, timeout:float|None = None) -> bool:
+        # Blocks until everything queued is written. False if it timed out.
+        with self.condition:
+            return self.condition.wait_for(lambda: self.waiting == None and not self.busy, timeout)
+
+    def stop(self, timeout:float|None = 5):
+        # Finishes off whatever's queued, then shuts the worker down.
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout)
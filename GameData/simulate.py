@@ -0,0 +1,70 @@
+# Headless simulation, for balancing.
+# Runs GameData days with a fixed timestep and no display or windows, as fast as the CPU allows.
+# Usage (from the top folder): python -m GameData.simulate --days 90 --seed 1
+
+import argparse
+import time
+from GameData.game import GameData, DAY_RUN, SIM_STEP_MS, read_cabinet_list, read_customer_list
+from GameData.actors import Cabinet, CustomerPool
+
+
+STEP_MS = SIM_STEP_MS
+
+
+def new_game(cablist:list, seed:int|None = None, use_numpy:bool = False, customer_pool:CustomerPool|None = None) -> GameData:
+    # Sets up a headless game the same way GameState.start_new_game does. Reads the customer list if you don't give a pool.
+    if customer_pool == None:
+        customer_pool = CustomerPool(read_customer_list())
+    game_data = GameData(None, seed = seed, use_numpy = use_numpy, customer_pool = customer_pool)
+    game_data.property.add_cabinet(Cabinet(cablist[0]))
+    return game_data
+
+
+def run_day(game_data:GameData, step_ms:int = STEP_MS):
+    # Runs one full day, from pre-day to the end of the day. No frames to wait for, so we just step until it's over.
+    game_data.clock.step_ms = step_ms
+    game_data.start_pre_day()
+    game_data.start_day()
+    while game_data.day_state == DAY_RUN:
+        game_data.sim_step()
+
+
+def simulate(days:int, seed:int|None = None, step_ms:int = STEP_MS, cablist:list|None = None, use_numpy:bool = False) -> dict:
+    # Runs a new game for the given number of days. Returns the finished GameData, the day records and how long it took.
+    if cablist == None:
+        cablist = read_cabinet_list()
+    game_data = new_game(cablist, seed, use_numpy)
+    day_records = []
+    start_time = time.perf_counter()
+    for i in range(days):
+        run_day(game_data, step_ms)
+        day_records.append(game_data.current_day)
+    elapsed = time.perf_counter() - start_time
+    return {
+        "game_data":game_data,
+        "days":day_records,
+        "seconds":elapsed,
+        "days_per_second":days / elapsed if elapsed > 0 else float("inf")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run the game with no display, as fast as possible.")
+    parser.add_argument("--days", type = int, default = 30, help = "how many days to simulate")
+    parser.add_argument("--seed", type = int, default = None, help = "random seed, same seed = same results")
+    parser.add_argument("--step", type = int, default = STEP_MS, help = "ms of game time per simulation step")
+    parser.add_argument("--numpy", action = "store_true", help = "draw random numbers with NumPy")
+    parser.add_argument("--quiet", action = "store_true", help = "only print the summary")
+    args = parser.parse_args()
+
+    result = simulate(args.days, args.seed, args.step, use_numpy = args.numpy)
+    if not args.quiet:
+        print("DAY\tDATE\tVISITORS\tINCOME")
+        for day in result["days"]:
+            print(f"{day.absolute_day}\t{day.month} {day.day}, Year {day.year}\t{day.visitors}\t{day.income:.2f}")
+    print(f"Simulated {args.days} days in {result['seconds']:.2f}s ({result['days_per_second']:.1f} days/s)")
+    print(f"Final funds: ${result['game_data'].money:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 
 from pygame import Rect
 from ui import *
+from collections import deque
+from itertools import islice
+
+FEED_MAX_LINES = 200 # how far back the data feed goes
 
 SPECIAL_CHARS = {
     "cab":"\u221A",         # √ 
@@ -91,17 +95,24 @@ class PropertyMap(Window):
         self.property = property
         # pull the property's map data:
         super().__init__(parent, Rect(0,11,24,17),property.name, fg = "WHITE", bg = "BLACK", hi = "RED", hi_bg = "BLACK")
-        self.customer_icons = []
+        self.customer_icons = {} # customer -> their icon (made here, customers don't carry one), each one is also one of our children
+        self.static_children = [] # walls and cabinets, only rebuilt when the layout changes
+        self.layout_version = -1 # the property's layout_version when we last built them
+        self.x_offset = 0
         self.entry_location = [self.property.size[0] // 2, 0]
         # draw the walls:
         
 
 
     def draw_map(self):
-        # Blanks the map and redraws it.
+        # Rebuilds the walls and cabinets if the layout changed since last time. Customer icons look after themselves (see place_customer)
+        if self.layout_version == self.property.layout_version:
+            return
+        self.layout_version = self.property.layout_version
         self.children = []
         
-        x_offset = (18 - self.property.size[0] ) // 2 # offset to center our property in the window
+        self.x_offset = (18 - self.property.size[0] ) // 2 # offset to center our property in the window
+        x_offset = self.x_offset
         top_wall = SPECIAL_CHARS["wallTL"]
         door = self.property.size[0] // 2
         index = 0
@@ -126,13 +137,33 @@ class PropertyMap(Window):
             cab_loc = [cabinet.location[0] + x_offset, cabinet.location[1] + 1]
             cab_char = Content(cab_loc, SPECIAL_CHARS["cab"], fg = "GREEN", bg = "BLACK")
             self.add_child(cab_char)
+        self.static_children = self.children
 
-        for c in self.customer_icons:
-            self.add_child(c)
+        self.children = self.static_children[:]
+        for customer, icon in self.customer_icons.items():
+            self.add_child(icon)
+            self.move_icon(customer)
 
     def place_customer(self, customer):
+        # Puts a customer's icon on the map, or moves it if it's already there.
         # TODO: colour code their frustration
-        self.customer_icons.append(customer.icon)
+        if customer not in self.customer_icons:
+            icon = Content([0,0], SPECIAL_CHARS["smiley"], customer.profile.colour, "BLACK")
+            self.customer_icons[customer] = icon
+            self.add_child(icon)
+        self.move_icon(customer)
+
+    def move_icon(self, customer):
+        # icons are placed in map space, same as the cabinets
+        spot = (customer.location[0] + self.x_offset, customer.location[1] + 1)
+        icon = self.customer_icons[customer]
+        if icon.area.topleft != spot:
+            icon.area.topleft = spot
+
+    def remove_customer(self, customer):
+        icon = self.customer_icons.pop(customer, None)
+        if icon in self.children:
+            self.children.remove(icon)
 
 
 class StatusWindow(Window):
@@ -153,6 +184,12 @@ class StatusWindow(Window):
         self.add_child(cablist)
         self.add_child(cab_details)
 
+        # long range stats, straight out of the history's running totals:
+        history = self.parent.history
+        if len(history) > 0:
+            averages = "  ".join(f"{days}d ${mean:,.2f}" for days, (total, mean) in history.stats("income").items())
+            self.add_child(Content([1,3], f"Avg income/day: {averages}"))
+
         start_day_button = Button([10,4], "START DAY", "BLACK", "WHITE", "WHITE", "BLACK", self.parent.start_day, highlight_on_hover= True)
         self.add_child(start_day_button)
 
@@ -165,31 +202,48 @@ class StatusWindow(Window):
         self.customer_label = Content([2,4], f"Customers: {self.parent.current_day.visitors}")
         
     def tick_day(self):
-        self.day_progress_bar.set_value(self.parent.day_timer)
+        # alpha fills in the time since the last sim step, so the bar moves smoothly at any speed
+        clock = self.parent.clock
+        self.day_progress_bar.set_value(min(self.parent.day_timer + clock.alpha * clock.step_ms, self.parent.day_length))
         self.money_label.update(new_text = f"Income: {self.parent.current_day.income}")
         self.customer_label.update(new_text = f"Customers: {self.parent.current_day.visitors}")
 
 
 class GraphWindow(Window):
-    def __init__(self, parent):
+    # The data feed. Keeps the last max_lines lines and only ever puts the ones on screen into text_content,
+    # so a long day doesn't make it slower or bigger. Scrolling moves through the lines instead of moving the viewport.
+    def __init__(self, parent, max_lines:int = FEED_MAX_LINES):
         super().__init__(parent, Rect(25,11,54,17), "DATA FEED",fg = "GREY", bg = "BLUE", allow_scroll= True)
         self.background = ColourBlock(Rect(0,0,52,16), ".", fg = "BLACK", bg= "BLACK")
         self.text_content = Content([1,1], "DATA FEED LIVES HERE", "WHITE", "BLACK")
         self.add_child(self.background)
         self.add_child(self.text_content)
-
-
+        self.lines = deque(["DATA FEED LIVES HERE"], max_lines) # oldest lines fall off the top
+        self.top_line = 0 # which line in self.lines is at the top of the window
+        self.visible_lines = self.viewport.height
+        self.v_scroll_bar = ScrollBar(self.area.height - 2, len(self.lines), self.visible_lines)
 
     def add_text_line(self, new_text:str):
-        new_text = self.text_content.raw_text + "\n" + new_text.format()
-        
-        text_size = len(new_text.splitlines())
-        size_diff = text_size - self.text_content.area.height
-        self.text_content.update(new_text = new_text)
-        if size_diff >= 0 and text_size > self.background.area.height:
-            
-            self.background.change_size(Rect(self.background.area.topleft, [self.background.area.width, text_size]))
-        
-            self.scroll_view(y= -size_diff)
+        # If we're looking at the newest lines, keep following them. Otherwise stay put on whatever we scrolled to.
+        following = self.top_line >= self.last_top_line()
+        if len(self.lines) == self.lines.maxlen:
+            self.top_line = max(0, self.top_line - 1) # the line at the top just moved up one
+        self.lines.append(new_text)
+        if following:
+            self.top_line = self.last_top_line()
+        self.refresh_view()
+
+    def last_top_line(self) -> int:
+        return max(0, len(self.lines) - self.visible_lines)
+
+    def scroll_view(self, x:int = 0, y:int = 0):
+        self.top_line = min(max(0, self.top_line + y), self.last_top_line())
+        self.refresh_view()
+
+    def refresh_view(self):
+        shown = islice(self.lines, self.top_line, self.top_line + self.visible_lines)
+        self.text_content.update(new_text = "\n".join(shown))
+        self.v_scroll_bar.update_size(len(self.lines))
+        self.v_scroll_bar.set_position(self.top_line)
 
 
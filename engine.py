@@ -1,4 +1,7 @@
 import pygame
+import time
+from array import array
+from collections import OrderedDict
 from ui import *
 
 # Default colours, commonly used special characters:
@@ -20,6 +23,8 @@ COLOURS = { #Shorthand names for colours
     "YELLOW":(255,255,85), 
     "WHITE":(255, 255, 255)
     }
+COLOUR_NAMES = list(COLOURS) # palette index -> colour name, tiles store colours as their index in here
+COLOUR_INDEX = {name:index for index, name in enumerate(COLOUR_NAMES)}
 DRAWTILES = {
     "topleft":"\u2554",
     "topright":"\u2557",
@@ -119,122 +124,195 @@ class Cursor:
 
 
 # Graphics management objects:
+NATIVE_FONT_SIZE = 16 # The size our font is designed for, 9x16 pixels per character
+
+def fit_scale(surface_size:list|tuple) -> int:
+    # The biggest whole-number scale that lets a surface of surface_size fit on the display. Never less than 1.
+    display_sizes = pygame.display.get_desktop_sizes()
+    if not display_sizes:
+        return 1
+    return max(1, min(display_sizes[0][0] // surface_size[0], display_sizes[0][1] // surface_size[1]))
+
+def scale_tile(glyph_size:list|tuple, scale:float) -> tuple:
+    # Size of a tile once it's scaled up, rounded to whole pixels.
+    return (max(1, round(glyph_size[0] * scale)), max(1, round(glyph_size[1] * scale)))
+
+class GlyphCache:
+    # Holds pre-rendered character surfaces, keyed by (char, fg, bg), so we only rasterize each combo once.
+    # Least recently used glyphs get thrown out once we go over max_size.
+    def __init__(self, font:pygame.font.Font, max_size:int = 1024) -> None:
+        self.font = font
+        self.max_size = max_size
+        self.glyphs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, char:str, fg:str, bg:str) -> pygame.Surface:
+        # Returns the rendered glyph, rendering (and storing) it if we haven't seen it before.
+        # char can also be a whole string, if you're drawing runs of text.
+        key = (char, fg, bg)
+        glyph = self.glyphs.get(key)
+        if glyph != None:
+            self.glyphs.move_to_end(key)
+            self.hits += 1
+            return glyph
+        self.misses += 1
+        glyph = self.font.render(char, False, COLOURS[fg], COLOURS[bg])
+        self.glyphs[key] = glyph
+        if len(self.glyphs) > self.max_size:
+            self.glyphs.popitem(last = False) # oldest one goes first
+        return glyph
+
+    def set_max_size(self, max_size:int) -> None:
+        # Changes the size cap, trimming old glyphs if we're now over it.
+        self.max_size = max_size
+        while len(self.glyphs) > self.max_size:
+            self.glyphs.popitem(last = False)
+
+    def clear(self, new_font:pygame.font.Font|None = None) -> None:
+        # Throws out every glyph. Pass a new font if the old one isn't valid anymore.
+        if new_font:
+            self.font = new_font
+        self.glyphs.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class GridTile:
-    def __init__(self, fg:str, bg:str, hi:str, hi_bg:str, x:int, y:int) -> None:
-        self.char = " "
-        self.fg = fg # text colour
-        self.bg = bg # Background colour
-        self.location = [x,y]
-        # Function related:
-        self.function = None
-        self.func_args = None
-        self.cursor_hi = False 
+    # A view onto one tile of a TileGrid. Tiles don't hold any data themselves, they just read/write the grid's arrays,
+    # so you can grab one with get_tile() and use it like an old-school tile object.
+    __slots__ = ("grid", "index")
+
+    def __init__(self, grid, x:int, y:int) -> None:
+        self.grid = grid
+        self.index = y * grid.columns + x
+
+    @property
+    def location(self) -> list:
+        return [self.index % self.grid.columns, self.index // self.grid.columns]
+
+    @property
+    def char(self) -> str:
+        return chr(self.grid.tile_chars[self.index])
+
+    @property
+    def fg(self) -> str:
+        return COLOUR_NAMES[self.grid.tile_fg[self.index]]
+
+    @property
+    def bg(self) -> str:
+        return COLOUR_NAMES[self.grid.tile_bg[self.index]]
+
+    @property
+    def cursor_hi(self) -> bool:
+        return bool(self.grid.tile_cursor[self.index])
+
+    @property
+    def function(self):
+        return self.grid.get_control(self.index)[0]
 
+    @property
+    def func_args(self):
+        return self.grid.get_control(self.index)[1]
         
     def change_char(self, char = None, fg = None, bg = None)-> None:
         # Change character and colours, all in one!!!!
         if char:
-            self.char = char[0]
+            self.grid.tile_chars[self.index] = ord(char[0])
         if fg:
-            self.fg = fg
+            self.grid.tile_fg[self.index] = COLOUR_INDEX[fg]
         if bg:
-            self.bg = bg
+            self.grid.tile_bg[self.index] = COLOUR_INDEX[bg]
 
     def cursor_state(self, new_state):
-        self.cursor_hi = new_state
+        self.grid.tile_cursor[self.index] = 1 if new_state else 0
     
     def set_function(self, new_func = None, new_args = None)-> None:
+        func, func_args = self.grid.get_control(self.index)
         if new_func:
-            self.function = new_func
+            func = new_func
         if new_args != None:
-            self.func_args = new_args
+            func_args = new_args
+        self.grid.tile_controls[self.index] = self.grid.add_control(func, func_args)
     
     def clear_function(self, just_args:bool = False)-> None:
-        if not just_args:
-            self.function = None
-        self.func_args = None
+        if just_args:
+            self.grid.tile_controls[self.index] = self.grid.add_control(self.function, None)
+        else:
+            self.grid.tile_controls[self.index] = 0
     
     def activate(self, args = None) -> None:
-        
-        if self.function == None:
+        function, func_args = self.grid.get_control(self.index)
+        if function == None:
             return # No assigned function.
         # Fires the assigned function
         
         if args != None:
-            self.function(*args)
-        elif self.func_args:
-            self.function(*self.func_args)
+            function(*args)
+        elif func_args:
+            function(*func_args)
         else:
-            self.function()
+            function()
         
 
 
-class GridManager:
-    def __init__(self, columns, rows,  size = 32) -> None:
-        self.font_size = size
-
-
-        self.font = pygame.font.Font("fonts/MxPlus_IBM_VGA_9x16.ttf", size)
-        self.tile_size = self.font.size(" ")
+class TileGrid:
+    # Storage for a grid of characters, plus all the functions for drawing onto it.
+    # Tiles are kept row by row in flat parallel arrays (character code, fg/bg palette index, cursor flag, control id)
+    # instead of being an object each, so blanking, filling and comparing frames is done a whole slice at a time.
+    def __init__(self, columns, rows, default_fg = "WHITE", default_bg = "BLUE") -> None:
         self.columns = columns
         self.rows = rows
-        self.grid = []
-        self.default_fg = "WHITE"
-        self.default_bg = "BLUE"
+        self.default_fg = default_fg
+        self.default_bg = default_bg
         self.default_hi = "BLACK"
         self.default_hi_bg = "ORANGE"
-        self.font_supports_progress_bars = False # If your font allows for 1/8th fill characters (unicode 0x2589 -> 0x258F)
-        
-        
-        # Use our functions to build the grid and the surface itself.
         self.build_grid()
-        self.build_surface()
-        
-    # Funcs related to construction or changing of grid itself:
 
-    def build_surface(self):
-        # (re)builds surface based on font parameters. Call any time you change font parameters (size, etc.)
-        surf_size = [self.tile_size[0] * self.columns, self.tile_size[1] * self.rows]
-        self.surface = pygame.Surface(surf_size)
-        
     def build_grid(self):
-        # (re)builds the grid of tiles, using the default fg/bg colour.
-        # Build our grid
-        for col in range(self.columns):
-            self.grid.append([])
-            for row in range(self.rows):
-                self.grid[col].append(GridTile(self.default_fg, self.default_bg, self.default_hi, self.default_hi_bg, col, row))
-
+        # (re)builds the tile arrays, using the default fg/bg colour.
+        tile_count = self.columns * self.rows
+        self.tile_chars = array("I", [ord(" ")]) * tile_count
+        self.tile_fg = array("B", [COLOUR_INDEX[self.default_fg]]) * tile_count
+        self.tile_bg = array("B", [COLOUR_INDEX[self.default_bg]]) * tile_count
+        self.tile_cursor = bytearray(tile_count)
+        self.tile_controls = array("I", [0]) * tile_count
+        # Tiles point at an entry in here for their function/arguments, 0 means nothing assigned.
+        self.control_table = [(None, None)]
+
+    def add_control(self, func, func_args) -> int:
+        # Returns the control id for this function/argument pair.
+        # Lots of tiles in a row usually share one, so we only check against the last one we added.
+        if func == None and func_args == None:
+            return 0
+        last_func, last_args = self.control_table[-1]
+        if last_func == func and last_args is func_args and len(self.control_table) > 1:
+            return len(self.control_table) - 1
+        self.control_table.append((func, func_args))
+        return len(self.control_table) - 1
+
+    def get_control(self, index:int) -> tuple:
+        # Returns the (function, arguments) assigned to the tile at the given array index
+        return self.control_table[self.tile_controls[index]]
 
     def change_default_colours(self, new_fg:str|None = None, new_bg:str|None = None, new_hi:str|None = None, new_hi_bg:str|None = None):
         # Sets the default colours to the new values, and updates any grid tiles that are using the old defaults.
-        old_fg = False
-        old_bg = False
-        old_hi = False
-        old_hi_bg = False
-
         if new_fg:
-            old_fg = self.default_fg
+            old_fg = COLOUR_INDEX[self.default_fg]
             self.default_fg = new_fg
+            for i in range(len(self.tile_fg)):
+                if self.tile_fg[i] == old_fg:
+                    self.tile_fg[i] = COLOUR_INDEX[new_fg]
         if new_bg:
-            old_bg = self.default_fg
+            old_bg = COLOUR_INDEX[self.default_bg]
             self.default_bg = new_bg
+            for i in range(len(self.tile_bg)):
+                if self.tile_bg[i] == old_bg:
+                    self.tile_bg[i] = COLOUR_INDEX[new_bg]
         if new_hi:
-            old_hi = self.default_hi
             self.default_hi = new_hi
         if new_hi_bg:
-            old_hi_bg = self.default_hi_bg
             self.default_hi_bg = new_hi_bg
-        for col in self.grid:
-            for tile in  col:
-                if tile.fg == old_fg:
-                    tile.fg = new_fg
-                if tile.bg == old_bg:
-                    tile.bg = new_bg
-                if tile.hi == old_hi:
-                    tile.hi = new_hi
-                if tile.hi_bg == old_hi_bg:
-                    tile.hi_bg = new_hi_bg
 
 
     # Drawing functions:
@@ -252,111 +330,348 @@ class GridManager:
             bg = self.default_bg
         if char == None:
             char = " " # assume we want to blank it.
+        # Only touch the tiles that are actually covered, one row slice at a time:
+        area = area.clip(pygame.Rect(0, 0, self.columns, self.rows))
+        if area.width <= 0 or area.height <= 0:
+            return
+        chars = array("I", [ord(char[0])]) * area.width
+        controls = array("I", [self.add_control(func, func_args)]) * area.width
+        fg_fill = array("B", [COLOUR_INDEX[fg]]) * area.width if fg else None # something falsy that isn't None leaves the old colour alone
+        bg_fill = array("B", [COLOUR_INDEX[bg]]) * area.width if bg else None
         
-        for col in self.grid:
-            for tile in col:
-                if area.collidepoint(tile.location):
-                    tile.change_char(char, fg, bg)
-                    # Reset the function:
-                    tile.clear_function()
-                    tile.set_function(func, func_args)
-                    tile.highlighted = highlighted
+        for row in range(area.top, area.bottom):
+            row_start = row * self.columns + area.left
+            row_end = row_start + area.width
+            self.tile_chars[row_start:row_end] = chars
+            if fg_fill:
+                self.tile_fg[row_start:row_end] = fg_fill
+            if bg_fill:
+                self.tile_bg[row_start:row_end] = bg_fill
+            self.tile_controls[row_start:row_end] = controls
 
     def set_char(self, x:int, y:int, char:str, fg:str|None = None, bg:str|None = None, func = None, func_args:list|tuple|None = None, clear_old_func = True):
         # Sets the individual grid square's character, and/or the function assigned to it:
-        self.grid[x][y].change_char(char, fg, bg)
-        if clear_old_func or func:
-            self.grid[x][y].clear_function()
+        if x < 0 or x >= self.columns or y < 0 or y >= self.rows:
+            raise IndexError(f"tile {x}, {y} is outside the {self.columns}x{self.rows} grid")
+        i = y * self.columns + x
+        if char:
+            self.tile_chars[i] = ord(char[0])
+        if fg:
+            self.tile_fg[i] = COLOUR_INDEX[fg]
+        if bg:
+            self.tile_bg[i] = COLOUR_INDEX[bg]
         if func:
-            self.grid[x][y].set_function(func, func_args)
+            self.tile_controls[i] = self.add_control(func, func_args)
+        elif clear_old_func:
+            self.tile_controls[i] = 0
             
 
     def write_string(self, string_to_write:str, origin:list|tuple, fg = None, bg = None, func = None, func_args = None, clear_old_func = True):
         # Writes a string to a series of tiles, optionally changing colour and assigning a function
-        if origin[0] >= self.columns or origin[1] >= self.rows:
+        if origin[0] >= self.columns or origin[1] >= self.rows or origin[1] < 0:
             print(f"OUT OF BOUNDS! CANNOT PRINT STRING: '{string_to_write}'")
             return
 
         if "\n" in string_to_write:
             string_to_write = string_to_write.splitlines()[0] # fuck you only one line at a time.
-        char_index = 0
-        while char_index < len(string_to_write):
-            if origin[0] + char_index > self.columns: # don't try to write outside the screen.
-                continue
-            self.grid[origin[0] + char_index][origin[1]].change_char(string_to_write[char_index], fg, bg)
-            if clear_old_func:
-                self.grid[origin[0] + char_index][origin[1]].clear_function()
-            self.grid[origin[0] + char_index][origin[1]].set_function(func, func_args)
-            char_index += 1
-
-    def write_infobar_string(self, left_text:str, right_text:str):
-        # We already know what the infobar will be so just do this ding dang thang.
-        char_index = 0
-        while char_index < len(left_text) or len(right_text):
-            if char_index < len(left_text):
-                self.grid[char_index][self.rows - 1].change_char(left_text[char_index])
-            if char_index < len(right_text):
-                self.grid[self.columns - len(right_text) + char_index][self.rows - 1].change_char(right_text[char_index])
-            char_index += 1
+        x = origin[0]
+        if x < 0: # starts off the left edge, lose the bit that's off screen
+            string_to_write = string_to_write[-x:]
+            x = 0
+        string_to_write = string_to_write[0:self.columns - x] # don't try to write outside the screen.
+        start = origin[1] * self.columns + x
+        end = start + len(string_to_write)
+        self.tile_chars[start:end] = array("I", map(ord, string_to_write))
+        if fg:
+            self.tile_fg[start:end] = array("B", [COLOUR_INDEX[fg]]) * len(string_to_write)
+        if bg:
+            self.tile_bg[start:end] = array("B", [COLOUR_INDEX[bg]]) * len(string_to_write)
+        if clear_old_func:
+            self.tile_controls[start:end] = array("I", [self.add_control(func, func_args)]) * len(string_to_write)
+        elif func or func_args != None:
+            for i in range(start, end):
+                old_func, old_args = self.get_control(i)
+                self.tile_controls[i] = self.add_control(func or old_func, old_args if func_args == None else func_args)
 
     def draw_hline(self, start, width, fg = None, bg = None, hi = None, hi_bg = None, char = DRAWTILES["horizontal"], func = None, func_args = None):
         # Draws a horizontal line
-        for i in range(width):
-            next_tile = self.grid[start[0] + i][start[1]]
-            next_tile.change_char(char, fg, bg)
-            
-            if func and func_args:
-                next_tile.set_func(func, func_args)
-            elif func:
-                next_tile.clear_function(True) # just clear the args
-            else:
-                next_tile.clear_function()
+        if start[1] < 0 or start[1] >= self.rows:
+            return
+        x = max(0, start[0]) # anything left of the screen gets cut off
+        width = min(width - (x - start[0]), self.columns - x)
+        if width <= 0:
+            return
+        first = start[1] * self.columns + x
+        self.fill_tiles(slice(first, first + width), width, char, fg, bg, func, func_args)
         
 
     def draw_vline(self, start, height, fg = None, bg = None, hi = None, hi_bg = None, func = None, func_args = None, char = DRAWTILES["vertical"], connect_lines = True):
         # Draws a vertical line
-        for i in range(height):
-            next_tile = self.grid[start[0]][start[1] + i]
-            next_tile.change_char(char, fg, bg)
-            # function stuff
-            if func and func_args:
-                next_tile.set_func(func, func_args)
-            elif func:
-                next_tile.clear_function(True) # just clear the args
-            else:
-                next_tile.clear_function()
+        if start[0] < 0 or start[0] >= self.columns:
+            return
+        y = max(0, start[1]) # anything above the screen gets cut off
+        height = min(height - (y - start[1]), self.rows - y)
+        if height <= 0:
+            return
+        first = y * self.columns + start[0]
+        self.fill_tiles(slice(first, first + height * self.columns, self.columns), height, char, fg, bg, func, func_args)
+
+    def fill_tiles(self, tiles:slice, count:int, char, fg, bg, func, func_args):
+        # Fills a slice of the tile arrays with a character, colours (None leaves them alone) and function
+        self.tile_chars[tiles] = array("I", [ord(char[0])]) * count
+        if fg:
+            self.tile_fg[tiles] = array("B", [COLOUR_INDEX[fg]]) * count
+        if bg:
+            self.tile_bg[tiles] = array("B", [COLOUR_INDEX[bg]]) * count
+        # function stuff
+        if func and func_args:
+            self.tile_controls[tiles] = array("I", [self.add_control(func, func_args)]) * count
+        elif func:
+            for i in range(len(self.tile_controls))[tiles]:
+                self.tile_controls[i] = self.add_control(self.get_control(i)[0], None) # just clear the args
+        else:
+            self.tile_controls[tiles] = array("I", [0]) * count
         
 
     def blank(self):
-        # Fills the grid with default colour, space as a character.
-        for x in self.grid:
-            for y in x:
-                y.change_char(" ", self.default_fg, self.default_bg)
+        # Fills the grid with default colour, space as a character, and drops every tile's function.
+        tile_count = self.columns * self.rows
+        self.tile_chars[:] = array("I", [ord(" ")]) * tile_count
+        self.tile_fg[:] = array("B", [COLOUR_INDEX[self.default_fg]]) * tile_count
+        self.tile_bg[:] = array("B", [COLOUR_INDEX[self.default_bg]]) * tile_count
+        self.tile_controls[:] = array("I", [0]) * tile_count
+        self.control_table = [(None, None)]
+
+    def make_buffer(self, columns, rows):
+        # Returns a new, blank grid with our default colours, for things to draw into offscreen.
+        return TileGrid(columns, rows, self.default_fg, self.default_bg)
+
+    def paste(self, source, origin:list|tuple, spans:list|None = None):
+        # Copies another grid's tiles (not the cursor) onto ours, with its top left corner at origin.
+        # spans is a list of (x, y, width) runs in our coordinates to copy, None copies everything that fits.
+        if spans == None:
+            spans = get_visible_spans(pygame.Rect(origin, (source.columns, source.rows)), [], self.columns, self.rows)
+        # Bring the source's functions along, shifting their control ids past ours:
+        offset = len(self.control_table) - 1
+        self.control_table += source.control_table[1:]
+        for x, y, width in spans:
+            src_start = (y - origin[1]) * source.columns + x - origin[0]
+            src_end = src_start + width
+            start = y * self.columns + x
+            self.tile_chars[start:start + width] = source.tile_chars[src_start:src_end]
+            self.tile_fg[start:start + width] = source.tile_fg[src_start:src_end]
+            self.tile_bg[start:start + width] = source.tile_bg[src_start:src_end]
+            self.tile_controls[start:start + width] = array("I", [control + offset if control else 0 for control in source.tile_controls[src_start:src_end]])
     # Interaction stuff:
 
     def get_tile(self, x, y) -> GridTile:
         # Returns the tile with the index of x, y
-        return self.grid[x][y]
+        return GridTile(self, x, y)
+
+
+def get_visible_spans(area:pygame.Rect, covering:list, columns:int, rows:int) -> list:
+    # Works out which parts of area (clipped to a columns x rows grid) aren't covered by any rect in covering.
+    # Returns a list of (x, y, width) runs, one or more per visible row.
+    spans = []
+    area = area.clip(pygame.Rect(0, 0, columns, rows))
+    for y in range(area.top, area.bottom):
+        row_spans = [(area.left, area.right)]
+        for rect in covering:
+            if rect.top <= y < rect.bottom:
+                uncovered = []
+                for start, end in row_spans:
+                    if rect.right <= start or rect.left >= end:
+                        uncovered.append((start, end))
+                        continue
+                    if rect.left > start:
+                        uncovered.append((start, rect.left))
+                    if rect.right < end:
+                        uncovered.append((rect.right, end))
+                row_spans = uncovered
+        for start, end in row_spans:
+            spans.append((start, y, end - start))
+    return spans
+
+
+class GridManager(TileGrid):
+    def __init__(self, columns, rows,  size:int|None = None, glyph_cache_size = 1024, native = False, run_cache_size = 1024) -> None:
+        # native = True renders the font at the size it was designed for (NATIVE_FONT_SIZE), and scales that up to size.
+        # If you don't give a size in native mode, we pick the biggest whole-number scale that fits the display.
+        self.native = native
+        if native:
+            self.font = pygame.font.Font("fonts/MxPlus_IBM_VGA_9x16.ttf", NATIVE_FONT_SIZE)
+            self.glyph_size = self.font.size(" ") # size of a tile on our (small) render surface
+            if size == None:
+                size = NATIVE_FONT_SIZE * fit_scale([self.glyph_size[0] * columns, self.glyph_size[1] * rows])
+            self.font_size = size
+            self.tile_size = scale_tile(self.glyph_size, size / NATIVE_FONT_SIZE) # size of a tile on the actual display
+        else:
+            if size == None:
+                size = 32
+            self.font_size = size
+            self.font = pygame.font.Font("fonts/MxPlus_IBM_VGA_9x16.ttf", size)
+            self.glyph_size = self.font.size(" ")
+            self.tile_size = self.glyph_size
+        self.glyph_cache = GlyphCache(self.font, glyph_cache_size) # pre-rendered characters, so we don't re-render every tile every frame
+        self.run_cache = GlyphCache(self.font, run_cache_size) # pre-rendered runs of text for render_mode "runs", kept apart so they can't push out single glyphs
+        self.font_supports_progress_bars = False # If your font allows for 1/8th fill characters (unicode 0x2589 -> 0x258F)
+        self.render_mode = "tiles" # "tiles" renders each tile on its own, "runs" renders stretches of same-coloured tiles as one string
+        
+        
+        # Use our functions to build the grid and the surface itself.
+        super().__init__(columns, rows)
+        self.build_surface()
+        
+    # Funcs related to construction or changing of grid itself:
+
+    def build_surface(self):
+        # (re)builds surface based on font parameters. Call any time you change font parameters (size, etc.)
+        # self.surface is what we render glyphs onto, self.output_surface is the one to actually show.
+        # They're the same surface unless we're in native mode, where output_surface is the scaled up copy.
+        surf_size = [self.glyph_size[0] * self.columns, self.glyph_size[1] * self.rows]
+        self.surface = pygame.Surface(surf_size)
+        if self.glyph_size == self.tile_size:
+            self.output_surface = self.surface
+        else:
+            self.output_surface = pygame.Surface([self.tile_size[0] * self.columns, self.tile_size[1] * self.rows])
+        self.full_redraw = True # new surface is blank, so everything needs drawing
+
+    def build_grid(self):
+        super().build_grid()
+        # Copies of the tile arrays as of the last update_screen(), to work out what changed:
+        self.drawn_chars = array("I", self.tile_chars)
+        self.drawn_fg = array("B", self.tile_fg)
+        self.drawn_bg = array("B", self.tile_bg)
+        self.drawn_cursor = bytearray(self.tile_cursor)
+        self.drawn_cursor_look = None
+        self.full_redraw = True
+
+    def write_infobar_string(self, left_text:str, right_text:str):
+        # We already know what the infobar will be so just do this ding dang thang.
+        self.write_string(left_text, [0, self.rows - 1], clear_old_func = False)
+        if right_text:
+            self.write_string(right_text, [self.columns - len(right_text), self.rows - 1], clear_old_func = False)
     
 
     # Rendering:
-    def update_screen(self, state) -> pygame.Surface:
-        # re-draws each character, returning our surface.
-        for col in range(self.columns):
-            for row in range(self.rows):
-                tile = self.grid[col][row]
-                if tile.cursor_hi:
-                    tsurf = self.font.render(tile.char, False, COLOURS[state.cursor.fg], COLOURS[state.cursor.bg])
-                else:
-                    tsurf = self.font.render(tile.char, False, COLOURS[tile.fg], COLOURS[tile.bg])
-                self.surface.blit(tsurf, [self.tile_size[0] * col, self.tile_size[1] * row])
-        return self.surface
+    def redraw_all(self):
+        # Forces every tile to be redrawn on the next update, use it if the surface got messed with.
+        self.full_redraw = True
+
+    def update_screen(self, state) -> list:
+        # re-draws any tiles that changed since the last update onto self.output_surface.
+        # Returns a list of the pixel rects that changed, to pass to pygame.display.update()
+        changed = []
+        blit_list = [] # (glyph, position) pairs, all blitted in one go at the end
+        tile_w, tile_h = self.glyph_size
+        cursor_look = (state.cursor.fg, state.cursor.bg)
+        if cursor_look != self.drawn_cursor_look:
+            self.drawn_cursor_look = cursor_look
+            self.full_redraw = True
+        for row in range(self.rows):
+            row_start = row * self.columns
+            row_end = row_start + self.columns
+            if (not self.full_redraw and self.tile_chars[row_start:row_end] == self.drawn_chars[row_start:row_end] 
+                and self.tile_fg[row_start:row_end] == self.drawn_fg[row_start:row_end] 
+                and self.tile_bg[row_start:row_end] == self.drawn_bg[row_start:row_end] 
+                and self.tile_cursor[row_start:row_end] == self.drawn_cursor[row_start:row_end]):
+                continue # nothing changed in this row
+            run_start = -1 # start column of the current run of changed tiles in this row
+            for col in range(self.columns + 1):
+                i = row_start + col
+                redraw = col < self.columns and (self.full_redraw or self.tile_chars[i] != self.drawn_chars[i] or self.tile_fg[i] != self.drawn_fg[i] 
+                                                 or self.tile_bg[i] != self.drawn_bg[i] or self.tile_cursor[i] != self.drawn_cursor[i])
+                # gather neighbouring changed tiles into one run:
+                if redraw and run_start < 0:
+                    run_start = col
+                elif not redraw and run_start >= 0:
+                    if self.render_mode == "runs":
+                        self.queue_text_runs(row, run_start, col, state, blit_list)
+                    else:
+                        self.queue_tiles(row, run_start, col, state, blit_list)
+                    changed.append(pygame.Rect(tile_w * run_start, tile_h * row, tile_w * (col - run_start), tile_h))
+                    run_start = -1
+            # This row is up to date now:
+            self.drawn_chars[row_start:row_end] = self.tile_chars[row_start:row_end]
+            self.drawn_fg[row_start:row_end] = self.tile_fg[row_start:row_end]
+            self.drawn_bg[row_start:row_end] = self.tile_bg[row_start:row_end]
+            self.drawn_cursor[row_start:row_end] = self.tile_cursor[row_start:row_end]
+        # fblits is quicker if our pygame has it, blits works everywhere else:
+        getattr(self.surface, "fblits", self.surface.blits)(blit_list)
+        self.full_redraw = False
+        if self.output_surface is not self.surface:
+            changed = self.scale_to_output(changed)
+        return changed
+
+    def scale_to_output(self, areas:list) -> list:
+        # Copies the given areas of our render surface onto the output surface, scaled up (nearest neighbour).
+        # Returns the matching areas on the output surface.
+        scaled_areas = []
+        for area in areas:
+            cols = area.width // self.glyph_size[0]
+            rows = area.height // self.glyph_size[1]
+            scaled = pygame.Rect(area.left // self.glyph_size[0] * self.tile_size[0], area.top // self.glyph_size[1] * self.tile_size[1], 
+                                 cols * self.tile_size[0], rows * self.tile_size[1])
+            pygame.transform.scale(self.surface.subsurface(area), scaled.size, self.output_surface.subsurface(scaled))
+            scaled_areas.append(scaled)
+        return scaled_areas
+
+    def queue_tiles(self, row, start, end, state, blit_list):
+        # Queues up one glyph per tile for columns start -> end of the row.
+        tile_w, tile_h = self.glyph_size
+        for col in range(start, end):
+            i = row * self.columns + col
+            if self.tile_cursor[i]:
+                glyph = self.glyph_cache.get(chr(self.tile_chars[i]), state.cursor.fg, state.cursor.bg)
+            else:
+                glyph = self.glyph_cache.get(chr(self.tile_chars[i]), COLOUR_NAMES[self.tile_fg[i]], COLOUR_NAMES[self.tile_bg[i]])
+            blit_list.append((glyph, (tile_w * col, tile_h * row)))
+
+    def queue_text_runs(self, row, start, end, state, blit_list):
+        # Queues up columns start -> end of the row, rendering each stretch of tiles with the same colours as one string.
+        # The cursor tile always gets drawn on its own.
+        row_start = row * self.columns
+        run_start = start
+        for col in range(start + 1, end + 1):
+            i = row_start + col
+            if (col < end and not self.tile_cursor[i] and not self.tile_cursor[i - 1] 
+                and self.tile_fg[i] == self.tile_fg[i - 1] and self.tile_bg[i] == self.tile_bg[i - 1]):
+                continue # still in the same run
+            self.queue_run(row, run_start, col, state, blit_list)
+            run_start = col
+
+    def queue_run(self, row, start, end, state, blit_list):
+        # Queues columns start -> end of the row as a single string. They all need to share colours!
+        tile_w, tile_h = self.glyph_size
+        first = row * self.columns + start
+        if end - start == 1 or self.tile_cursor[first]:
+            self.queue_tiles(row, start, end, state, blit_list)
+            return
+        text = "".join(map(chr, self.tile_chars[first:first + end - start]))
+        glyph = self.run_cache.get(text, COLOUR_NAMES[self.tile_fg[first]], COLOUR_NAMES[self.tile_bg[first]])
+        if glyph.get_width() == tile_w * len(text):
+            blit_list.append((glyph, (tile_w * start, tile_h * row)))
+        else:
+            self.queue_tiles(row, start, end, state, blit_list) # font isn't lining up, do it the slow way
 
     def change_font(self, size):
         # Changes the size, or toggles font type
         self.font_size = size
+        if self.native:
+            # Our glyphs are all still good, we just scale them differently.
+            self.tile_size = scale_tile(self.glyph_size, size / NATIVE_FONT_SIZE)
+            self.build_surface()
+            return
         self.font = pygame.font.Font("fonts/MxPlus_IBM_VGA_9x16.ttf", size)
+        # Every cached glyph was rendered with the old font, so toss them and resize our surface to match.
+        self.glyph_cache.clear(self.font)
+        self.run_cache.clear(self.font)
+        self.glyph_size = self.font.size(" ")
+        self.tile_size = self.glyph_size
+        self.build_surface()
+
 # State/interactables:
+JOB_BUDGET_MS = 8 # how long StateManager.run_jobs() can take per frame, about half of a 60fps frame
 
 class StateManager:
     # Manages windows, menus, cursor, etc. 
@@ -371,6 +686,8 @@ class StateManager:
         self.run = True # Do we kill the process?
         self.input_target = None # What object are we targeting keyboard inputs to?
         self.display_target = None 
+        self.jobs = [] # generators doing long work a slice at a time, see add_job()
+        self.job_budget_ms = JOB_BUDGET_MS
 
 
     # Display:
@@ -382,9 +699,28 @@ class StateManager:
         # Doesn't update the physics/time delta!!!!
         if self.display_target == None:
             return # can't do that with one of these!!!
-        self.display_target.fill((0,0,0)) # Fill with black
-        self.display_target.blit(self.grid.update_screen(self), [0,0])
-        pygame.display.flip() # flip the display asap
+        changed = self.grid.update_screen(self)
+        for area in changed:
+            self.display_target.blit(self.grid.output_surface, area, area)
+        pygame.display.update(changed) # push it to the display asap
+
+    # Jobs:
+
+    def add_job(self, job):
+        # job is a generator (or any iterator). It gets advanced every frame until it runs out, so each yield
+        # should be a spot where it's fine to stop and let the screen draw. Good for loading stuff without freezing up.
+        self.jobs.append(job)
+
+    def run_jobs(self):
+        # Advances jobs, oldest first, until they're done or this frame's time budget is used up.
+        if len(self.jobs) == 0:
+            return
+        deadline = time.perf_counter() + self.job_budget_ms / 1000
+        while len(self.jobs) > 0 and time.perf_counter() < deadline:
+            try:
+                next(self.jobs[0])
+            except StopIteration:
+                self.jobs.pop(0)
 
     # Windows:
 
@@ -392,9 +728,17 @@ class StateManager:
         self.windows.append(window)
         # maybe do some stuff around management in here?
 
+    def window_stack(self) -> list:
+        # Windows in drawing order, bottom first. Always-on-top windows go above everything else.
+        return [w for w in self.windows if not w.always_on_top] + [w for w in self.windows if w.always_on_top]
+
     def draw_windows(self, delta):
-        for win in self.windows:
-            win.draw(self.grid, delta)
+        # Windows get copied onto the grid from the top of the pile down, skipping anything already covered up.
+        covered = [] # footprints of the windows above the one we're drawing
+        for win in reversed(self.window_stack()):
+            footprint = win.footprint()
+            win.draw(self.grid, delta, get_visible_spans(footprint, covered, self.grid.columns, self.grid.rows))
+            covered.append(footprint)
 
 
     def purge_windows(self):
@@ -434,13 +778,13 @@ class StateManager:
     # Cursor Stuff:
 
     def move_cursor(self, vector_x, vector_y):
-        self.grid.get_tile(self.cursor.position[0], self.cursor.position[1]).cursor_hi = False
+        self.grid.get_tile(self.cursor.position[0], self.cursor.position[1]).cursor_state(False)
         self.cursor.move(vector_x, vector_y)
         
 
     def cursor_blink(self, delta):
         curs_tile = self.grid.get_tile(self.cursor.position[0], self.cursor.position[1])
-        curs_tile.cursor_hi = self.cursor.blink(delta)
+        curs_tile.cursor_state(self.cursor.blink(delta))
 
 
     # Input:           
@@ -450,7 +794,7 @@ class StateManager:
         # These are just "suggested" key shortcuts.
         if self.key_mode == 0:
             if key == pygame.K_ESCAPE: # TEMP: exit the game on escape.
-                self.run = False
+                self.quit()
                 print("BYE BYE (escape pressed)")
             if key == pygame.K_UP:
                 self.move_cursor(0,-1)
@@ -491,7 +835,9 @@ class StateManager:
             if event.type == pygame.TEXTINPUT and self.input_target:
                 self.input_target.text_input(event.text)
             if event.type == pygame.QUIT:
-                self.run = False
+                self.quit()
+            if event.type == pygame.VIDEOEXPOSE:
+                self.grid.redraw_all() # our window got covered up, so paint everything again
             if event.type == pygame.KEYDOWN:
                 self.handle_keypress(event.key)
             if event.type == pygame.MOUSEMOTION:
@@ -518,7 +864,7 @@ class StateManager:
             mouse_x = mouse_pos[0] // self.grid.tile_size[0]
             mouse_y = mouse_pos[1] // self.grid.tile_size[1]
             move = self.cursor.move_to_position(mouse_x, mouse_y)
-            self.grid.get_tile(move[0], move[1]).cursor_hi = False
+            self.grid.get_tile(move[0], move[1]).cursor_state(False)
             
         
 
@@ -547,6 +893,7 @@ class StateManager:
     def tick(self, delta):
         # Basic draw logic, todo: add game update here.
         # Game logic lives here:
+        self.run_jobs()
         self.program_logic(delta)
 
 
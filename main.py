@@ -14,7 +14,7 @@ _delta = 0 # ms since last frame change
 # Grid, state managers:
 grid = GridManager(80,30)
 state = GameState(grid)
-screen = pygame.display.set_mode(grid.surface.get_size())
+screen = pygame.display.set_mode(grid.output_surface.get_size())
 state.set_display_target(screen)
 
 pygame.mouse.set_visible(False)
@@ -34,10 +34,11 @@ while state.run:
 
 
 
-    # Blank and draw data from grid:
-    screen.fill((0,0,0))
-    screen.blit(grid.update_screen(state), [0,0])
-    pygame.display.flip()
+    # Draw whatever changed on the grid, and only push those bits to the display:
+    changed = grid.update_screen(state)
+    for area in changed:
+        screen.blit(grid.output_surface, area, area)
+    pygame.display.update(changed)
     
 
     # cap frame rate at 60
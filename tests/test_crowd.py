@@ -0,0 +1,49 @@
+# CrowdSim.nearest_cabinets searches ring by ring, it should always agree with checking every cabinet.
+# Run from the top folder: python -m pytest
+
+import pytest
+from GameData.actors import CustomerPool, CustomerProfile
+from GameData.crowd import CrowdSim, make_test_property, np
+
+pytestmark = pytest.mark.skipif(np == None, reason = "CrowdSim needs NumPy")
+
+
+def scattered_crowd(count:int, busy:float, seed:int) -> CrowdSim:
+    # count customers dropped anywhere in the room, with about busy of the cabinets taken
+    crowd = CrowdSim(make_test_property(count), seed = seed)
+    crowd.spawn(count // 2, CustomerProfile(["MAZE FAN", "MAZE", "50", "100", "GREEN", "1"]))
+    crowd.spawn(count - count // 2, CustomerProfile(["ACTION FAN", "ACTION", "50", "100", "RED", "1"]))
+    rng = np.random.default_rng(seed)
+    crowd.location[0:count, 0] = rng.integers(0, crowd.width, count)
+    crowd.location[0:count, 1] = rng.integers(0, crowd.height, count)
+    crowd.cab_busy[:] = rng.random(len(crowd.cabinets)) < busy
+    return crowd
+
+
+def brute_force(crowd:CrowdSim, customers, favourites_only:bool):
+    everything = np.arange(len(crowd.cabinets), dtype = np.int32)
+    return crowd.closest_of(customers, np.broadcast_to(everything, (len(customers), len(everything))), favourites_only)[0]
+
+
+@pytest.mark.parametrize("count, busy", [(10, 0.0), (1000, 0.5), (5000, 0.9), (5000, 0.99)])
+@pytest.mark.parametrize("favourites_only", [True, False])
+def test_nearest_matches_brute_force(count, busy, favourites_only):
+    crowd = scattered_crowd(count, busy, seed = count)
+    customers = np.arange(count)
+    assert (crowd.nearest_cabinets(customers, favourites_only) == brute_force(crowd, customers, favourites_only)).all()
+
+
+def test_nothing_free_finds_nothing():
+    crowd = scattered_crowd(1000, 1.0, seed = 1)
+    assert (crowd.nearest_cabinets(np.arange(1000), False) == -1).all()
+
+
+def test_spawn_from_pool_uses_the_profiles():
+    pool = CustomerPool([["RICH", "MAZE", "80", "120", "GREEN", "3"], ["POOR", "ACTION", "5", "40", "RED", "1"]])
+    crowd = CrowdSim(make_test_property(100), seed = 1)
+    crowd.spawn_from_pool(pool, 400)
+    money = crowd.money[0:400]
+    assert crowd.population() == 400
+    assert set(money.tolist()) == {80.0, 5.0}
+    assert (crowd.patience[0:400][money == 80.0] == 120).all()
+    assert 200 < np.count_nonzero(money == 80.0) < 400 # weighted 3:1
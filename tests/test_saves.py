@@ -0,0 +1,113 @@
+# Round trips through GameData/saves.py: a restored game should be the same game, and bad files should only ever give SaveErrors.
+# Run from the top folder: python -m pytest
+
+import io
+import struct
+import pytest
+from GameData.actors import CustomerPool
+from GameData.game import GameData, DAY_RUN, read_cabinet_list, read_customer_list
+import GameData.rng as GameData_rng
+from GameData.rng import np
+from GameData.saves import MAGIC, SaveError, capture, decode, encode, restore
+from GameData.simulate import new_game, run_day
+
+
+BACKENDS = [False, pytest.param(True, marks = pytest.mark.skipif(np == None, reason = "NumPy isn't installed"))]
+
+
+def mid_day_game(use_numpy:bool) -> GameData:
+    # A seeded game a few days in, stopped partway through a day so there are customers and a queue to save.
+    game_data = new_game(read_cabinet_list(), seed = 7, use_numpy = use_numpy)
+    for i in range(5):
+        run_day(game_data)
+    game_data.start_pre_day()
+    game_data.start_day()
+    for i in range(1000):
+        game_data.sim_step()
+    assert game_data.day_state == DAY_RUN and game_data.customers
+    return game_data
+
+
+def to_bytes(game_data:GameData) -> bytes:
+    return b"".join(encode(capture(game_data)))
+
+
+def load(data:bytes) -> GameData:
+    loaded = GameData(None, customer_pool = CustomerPool(read_customer_list()))
+    restore(decode(io.BytesIO(data)), loaded)
+    return loaded
+
+
+def chunk_span(data:bytes, tag:bytes) -> tuple:
+    # (start, end) of a chunk's body in a save file
+    position = len(MAGIC) + 2
+    while True:
+        length = struct.unpack_from("<I", data, position + 4)[0]
+        if data[position:position + 4] == tag:
+            return position + 8, position + 8 + length
+        position += 8 + length
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_round_trip_keeps_state(use_numpy):
+    game_data = mid_day_game(use_numpy)
+    loaded = load(to_bytes(game_data))
+    assert capture(loaded) == capture(game_data)
+    assert loaded.property.occupancy == game_data.property.occupancy
+    assert [cust.location for cust in loaded.customers] == [cust.location for cust in game_data.customers]
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_round_trip_plays_out_the_same(use_numpy):
+    game_data = mid_day_game(use_numpy)
+    loaded = load(to_bytes(game_data))
+    for game in (game_data, loaded):
+        for i in range(5000):
+            game.sim_step()
+        run_day(game)
+    assert capture(loaded) == capture(game_data)
+    assert loaded.money == game_data.money
+
+
+def test_truncated_files_raise_save_error():
+    data = to_bytes(mid_day_game(False))
+    for length in (0, 5, len(MAGIC) + 2, len(MAGIC) + 7, len(data) // 2, len(data) - 1):
+        with pytest.raises(SaveError):
+            decode(io.BytesIO(data[:length]))
+
+
+def test_bad_header_raises_save_error():
+    data = to_bytes(mid_day_game(False))
+    with pytest.raises(SaveError):
+        decode(io.BytesIO(b"NOTASAVE" + data[len(MAGIC):]))
+    with pytest.raises(SaveError):
+        decode(io.BytesIO(MAGIC + struct.pack("<H", 999) + data[len(MAGIC) + 2:])) # from the future
+
+
+@pytest.mark.parametrize("tag", [b"GAME", b"DATE", b"RAND", b"PROP", b"CABS", b"HIST", b"CUST"])
+def test_corrupt_chunk_body_raises_save_error(tag):
+    data = bytearray(to_bytes(mid_day_game(False)))
+    start, end = chunk_span(data, tag)
+    data[start:end] = b"\xff" * (end - start) # framing's fine, what's inside isn't
+    with pytest.raises(SaveError):
+        load(bytes(data))
+
+
+def test_bad_values_raise_save_error_and_leave_the_game_alone():
+    game_data = mid_day_game(False)
+    snapshot = capture(game_data)
+    bad_state = dict(snapshot, customers = tuple(cust[:6] + (99,) + cust[7:] for cust in snapshot["customers"]))
+    bad_target = dict(snapshot, customers = tuple(cust[:7] + (99,) + cust[8:] for cust in snapshot["customers"]))
+    bad_rng = dict(snapshot, rng = (False, (3, (1, 2, 3), None), []))
+    for bad in (bad_state, bad_target, bad_rng):
+        with pytest.raises(SaveError):
+            restore(bad, game_data)
+        assert capture(game_data) == snapshot
+
+
+@pytest.mark.skipif(np == None, reason = "NumPy isn't installed")
+def test_numpy_save_without_numpy_raises_save_error(monkeypatch):
+    data = to_bytes(mid_day_game(True))
+    monkeypatch.setattr(GameData_rng, "np", None)
+    with pytest.raises(SaveError):
+        load(data)
@@ -51,7 +51,7 @@ class ScrollBar:
             else:
                 newtext += DRAWTILES["uparrow"]
 
-            lines_per_char = self.maxscroll / self.bar_size
+            lines_per_char = self.maxscroll / (self.bar_size - 1) # bar_size includes one of the arrows
 
             for i in range(self.bar_size - 1):
                 if self.current_position > lines_per_char * (i + 1) or self.current_position < lines_per_char * i:
@@ -74,6 +74,11 @@ class ScrollBar:
         elif self.current_position > self.maxscroll:
             self.current_position = self.maxscroll
         self.refresh_text() # refresh our bar position
+
+    def set_position(self, position):
+        # jumps straight to a position, for when whoever owns us keeps track of it themselves
+        self.current_position = min(max(0, position), max(0, self.maxscroll))
+        self.refresh_text()
     
     def update_size(self, content_size):
         # updates the scrollbar to account for a change in window size
@@ -244,6 +249,10 @@ class InfoBar:
 
 class Content:
     # Generic object for text, parent of all other ui elements.
+    # Plain Content gets made a lot (every label, map icon, etc.) so it uses __slots__. Subclasses still get a __dict__.
+    __slots__ = ("fg", "bg", "hi", "hi_bg", "func", "func_args", "hi_on_hover", "highlighted", "handles_raw_text",
+                 "parent_control", "queue_destroy", "raw_text", "text_lines", "area", "absolute_area")
+
     def __init__(self, location:list|tuple, text:str, fg = None, bg = None, hi = None, hi_bg = None) -> None:
         self.fg = fg
         self.bg = bg
@@ -271,6 +280,10 @@ class Content:
         self.area = Rect(location[0], location[1], width, height)
         self.absolute_area = self.area.copy()
 
+    def render_key(self) -> tuple:
+        # Everything about us that changes how we get drawn, so windows can tell if they need to redraw us.
+        return (self.area.topleft, self.area.size, tuple(self.text_lines), self.highlighted, self.fg, self.bg, self.hi, self.hi_bg, self.func, self.func_args)
+
     def set_parent(self, new_parent):
         self.parent_control = new_parent
         self.absolute_area.move_ip(new_parent.area.topleft)
@@ -577,6 +590,10 @@ class Window:
         self.destroy = False
 
 
+        # Offscreen drawing, see draw():
+        self.buffer = None
+        self.buffer_key = None
+
         # Scrolling related:
         self.v_scroll_bar = None
         self.h_scroll_bar = None
@@ -639,62 +656,86 @@ class Window:
 
 
 
-    def draw(self, target_grid, delta):
+    def draw(self, target_grid, delta, visible_spans:list|None = None):
         # Draws the window and its contents to the given grid manager
+        # We draw into our own buffer, which only gets rebuilt if something about us changed, and then copy it over.
+        # visible_spans is a list of (x, y, width) bits of the grid we're allowed to copy to (see get_visible_spans)
         # make sure all of our children want to exist:
+        self.children = [child for child in self.children if not child.queue_destroy]
         for child in self.children:
-            if child.queue_destroy:
-                self.children.remove(child)
-                
+            child.tick(delta) # pass our delta time to the child
+        if visible_spans == []:
+            return # completely covered up, don't bother
         
+        if self.buffer == None or self.buffer.columns != self.area.width + 1 or self.buffer.rows != self.area.height + 1:
+            self.buffer = target_grid.make_buffer(self.area.width + 1, self.area.height + 1)
+            self.buffer_key = None
+        new_key = self.render_key()
+        if new_key != self.buffer_key:
+            self.buffer_key = new_key
+            self.buffer.blank()
+            self.render(self.buffer, Rect(0, 0, self.area.width, self.area.height))
+        target_grid.paste(self.buffer, self.area.topleft, visible_spans)
+
+    def render_key(self) -> tuple:
+        # Everything that changes how we look. If this is the same as last frame, our buffer is still good.
+        return (self.area.size, self.viewport.topleft, self.title, self.fg, self.bg, self.border, self.show_close,
+                self.v_scroll_bar and (self.v_scroll_bar.visible, self.v_scroll_bar.astext),
+                [child.render_key() for child in self.children])
+
+    def footprint(self) -> Rect:
+        # The grid space we cover, including the right/bottom border.
+        return Rect(self.area.left, self.area.top, self.area.width + 1, self.area.height + 1)
+
+    def render(self, target_grid, area:Rect):
+        # Draws the window frame and contents onto target_grid, using area as our position on it.
         # start with a blank square
-        target_grid.draw_square(self.area, " ", self.fg, self.bg, highlighted = False)
+        target_grid.draw_square(area, " ", self.fg, self.bg, highlighted = False)
         # Borders:
-        target_grid.draw_hline(self.area.topleft, self.area.width + 1, self.border, self.bg)
-        target_grid.draw_hline(self.area.bottomleft, self.area.width + 1, self.border, self.bg)
-        target_grid.draw_vline(self.area.topleft, self.area.height + 1, self.border, self.bg)
+        target_grid.draw_hline(area.topleft, area.width + 1, self.border, self.bg)
+        target_grid.draw_hline(area.bottomleft, area.width + 1, self.border, self.bg)
+        target_grid.draw_vline(area.topleft, area.height + 1, self.border, self.bg)
         if self.v_scroll_bar and self.v_scroll_bar.visible:
             for i in range(self.v_scroll_bar.bar_size):
                 if i == 0:
-                    target_grid.set_char(self.area.right, self.area.top + 1 + i, self.v_scroll_bar.astext[i], self.border, self.bg, func = self.scroll_view, func_args = [0,-1])    
+                    target_grid.set_char(area.right, area.top + 1 + i, self.v_scroll_bar.astext[i], self.border, self.bg, func = self.scroll_view, func_args = [0,-1])    
                 else:
-                    target_grid.set_char(self.area.right, self.area.top + 1 + i, self.v_scroll_bar.astext[i], self.border, self.bg)
-            target_grid.set_char(self.area.right, self.area.top + self.v_scroll_bar.bar_size + 1, self.v_scroll_bar.astext[-1], self.border, self.bg, func= self.scroll_view, func_args = [0,1])
+                    target_grid.set_char(area.right, area.top + 1 + i, self.v_scroll_bar.astext[i], self.border, self.bg)
+            target_grid.set_char(area.right, area.top + self.v_scroll_bar.bar_size + 1, self.v_scroll_bar.astext[-1], self.border, self.bg, func= self.scroll_view, func_args = [0,1])
                     
         else:
-            target_grid.draw_vline(self.area.topright, self.area.height, self.border, self.bg)
+            target_grid.draw_vline(area.topright, area.height, self.border, self.bg)
         # corners:
-        target_grid.set_char(self.area.left, self.area.top, DRAWTILES["topleft"], self.border, self.bg)
-        target_grid.get_tile(self.area.left, self.area.top).clear_function()
-        target_grid.set_char(self.area.left, self.area.bottom, DRAWTILES["bottomleft"], self.border, self.bg)
-        target_grid.get_tile(self.area.left, self.area.bottom).clear_function()
-        target_grid.set_char(self.area.right, self.area.top, DRAWTILES["topright"], self.border, self.bg)
-        target_grid.get_tile(self.area.right, self.area.top).clear_function()
-        target_grid.set_char(self.area.right, self.area.bottom, DRAWTILES["bottomright"], self.border, self.bg)
-        target_grid.get_tile(self.area.right, self.area.bottom).clear_function()
+        target_grid.set_char(area.left, area.top, DRAWTILES["topleft"], self.border, self.bg)
+        target_grid.get_tile(area.left, area.top).clear_function()
+        target_grid.set_char(area.left, area.bottom, DRAWTILES["bottomleft"], self.border, self.bg)
+        target_grid.get_tile(area.left, area.bottom).clear_function()
+        target_grid.set_char(area.right, area.top, DRAWTILES["topright"], self.border, self.bg)
+        target_grid.get_tile(area.right, area.top).clear_function()
+        target_grid.set_char(area.right, area.bottom, DRAWTILES["bottomright"], self.border, self.bg)
+        target_grid.get_tile(area.right, area.bottom).clear_function()
 
         # Title bar:
-        if len(self.title) > self.area.width - 4:
-            draw_title = self.title[0:self.area.width - 5] + "~"
+        if len(self.title) > area.width - 4:
+            draw_title = self.title[0:area.width - 5] + "~"
         else:
             draw_title = self.title
-        target_grid.write_string(draw_title, [self.area.left + 1, self.area.top], self.border, self.bg)
+        target_grid.write_string(draw_title, [area.left + 1, area.top], self.border, self.bg)
 
         if self.show_close:
-            target_grid.set_char(self.area.right - 1, self.area.top, "X", fg = "RED", bg = "GREY", func = self.queue_destroy)
+            target_grid.set_char(area.right - 1, area.top, "X", fg = "RED", bg = "GREY", func = self.queue_destroy)
 
         # Contents:
         
         for child in self.children:
-            child.tick(delta) # pass our delta time to the child
             # Get the child's absolute position
-            child_start_x = child.area.left - self.viewport.left + self.area.left + 1
-            child_start_y = child.area.top - self.viewport.top + self.area.top + 1
+            child_start_x = child.area.left - self.viewport.left + area.left + 1
+            child_start_y = child.area.top - self.viewport.top + area.top + 1
             for y_range in range(child.area.height):
-                if child_start_y + y_range < self.area.bottom and child_start_y + y_range > self.area.top:
+                if child_start_y + y_range < area.bottom and child_start_y + y_range > area.top:
                     # Only print within the window area
                     for x_range in range(len(child.text_lines[y_range])):
-                        if child_start_x + x_range < self.area.right and child_start_x + x_range> self.area.left:
+                        if child_start_x + x_range < area.right and child_start_x + x_range> area.left:
                             if child.highlighted:
                                 
                                 target_grid.set_char(child_start_x + x_range, child_start_y + y_range, 